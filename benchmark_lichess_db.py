@@ -0,0 +1,189 @@
+import argparse
+import contextlib
+import io
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from chess.encoding import unpack_fen, unpack_moves
+from import_lichess_puzzles import CSV_FILE, bulk_convert_csv_to_sqlite
+
+# ----- CONFIG -----
+SAMPLES = 2000
+COLD_SAMPLES = 200
+MMAP_SIZE = 268435456
+
+FETCH_SQL = """
+    SELECT puzzle_id, fen, moves, rating, theme_mask,
+           orientation, side_to_move, plies
+    FROM puzzles
+    WHERE puzzle_id = ?
+"""
+
+
+def build(csv_file, sqlite_file, compact, workers):
+    # Misma ruta que --bulk; la salida del importador no interesa aquí
+    with contextlib.redirect_stdout(io.StringIO()):
+        ok = bulk_convert_csv_to_sqlite(csv_file, sqlite_file, workers, compact)
+    if not ok:
+        raise SystemExit(f"ERROR: no se pudo importar {csv_file}")
+
+
+def connect(sqlite_file):
+    uri = Path(sqlite_file).resolve().as_uri() + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True)
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    return conn
+
+
+def drop_page_cache(sqlite_file):
+    """
+    Saca el archivo de la page cache del SO (posix_fadvise).
+    False si la plataforma no lo permite.
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return False
+
+    fd = os.open(sqlite_file, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+    return True
+
+
+def fetch(conn, puzzle_id):
+    # Lo mismo que hace Puzzle al construirse: decodificar por tipo
+    row = conn.execute(FETCH_SQL, (puzzle_id,)).fetchone()
+    fen, moves = row[1], row[2]
+    if isinstance(fen, bytes):
+        fen = unpack_fen(fen)
+    moves = unpack_moves(moves) if isinstance(moves, bytes) else moves.split()
+    return fen, moves
+
+
+def measure_cold(sqlite_file, ids):
+    """
+    Cada lectura con la page cache del SO vacía y una conexión nueva
+    (sin cache de páginas de SQLite).
+    """
+    timings = []
+    for puzzle_id in ids:
+        conn = connect(sqlite_file)
+        conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone()
+        if not drop_page_cache(sqlite_file):
+            conn.close()
+            return None
+
+        start = time.perf_counter()
+        fetch(conn, puzzle_id)
+        timings.append(time.perf_counter() - start)
+        conn.close()
+    return timings
+
+
+def measure_warm(sqlite_file, ids):
+    conn = connect(sqlite_file)
+
+    # Primera pasada para calentar page cache y mmap
+    for puzzle_id in ids:
+        fetch(conn, puzzle_id)
+
+    timings = []
+    for puzzle_id in ids:
+        start = time.perf_counter()
+        fetch(conn, puzzle_id)
+        timings.append(time.perf_counter() - start)
+    conn.close()
+    return timings
+
+
+def summary(timings):
+    if timings is None:
+        return "no disponible (sin posix_fadvise)"
+
+    micros = sorted(t * 1e6 for t in timings)
+    p95 = micros[int(len(micros) * 0.95) - 1]
+    return (
+        f"media {statistics.mean(micros):8.1f} µs | "
+        f"p50 {statistics.median(micros):8.1f} µs | "
+        f"p95 {p95:8.1f} µs"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compara el formato texto y el compacto de la base de puzzles"
+    )
+    parser.add_argument(
+        "--csv",
+        default=CSV_FILE,
+        help="CSV de Lichess, plano o comprimido (.zst, .gz, .bz2)",
+    )
+    parser.add_argument(
+        "--dir",
+        help="Directorio donde crear las dos bases (por defecto, uno temporal)",
+    )
+    parser.add_argument(
+        "--samples",
+        type=int,
+        default=SAMPLES,
+        help="Lecturas por id con la cache caliente",
+    )
+    parser.add_argument(
+        "--cold-samples",
+        type=int,
+        default=COLD_SAMPLES,
+        help="Lecturas por id con la cache fría",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Procesos que parsean el CSV durante la importación",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as workdir:
+        layouts = {
+            "texto": Path(workdir) / "text.sqlite3",
+            "compacto": Path(workdir) / "compact.sqlite3",
+        }
+
+        for name, path in layouts.items():
+            print(f"Importando formato {name}...")
+            build(args.csv, path, name == "compacto", args.workers)
+
+        conn = sqlite3.connect(layouts["texto"])
+        ids = [row[0] for row in conn.execute("SELECT puzzle_id FROM puzzles")]
+        conn.close()
+
+        random.seed(0)
+        warm_ids = random.choices(ids, k=args.samples)
+        cold_ids = random.choices(ids, k=args.cold_samples)
+
+        for name, path in layouts.items():
+            conn = sqlite3.connect(path)
+            payload, compact = conn.execute("""
+                SELECT SUM(length(fen) + length(moves)),
+                       SUM(typeof(moves) = 'blob')
+                FROM puzzles
+            """).fetchone()
+            conn.close()
+
+            print("=" * 60)
+            print(f"Formato {name}")
+            print(f"  Tamaño:         {path.stat().st_size / 2**20:8.2f} MiB")
+            print(f"  fen + moves:    {payload / 2**20:8.2f} MiB "
+                  f"({compact} de {len(ids)} puzzles compactos)")
+            print(f"  Cache fría:     {summary(measure_cold(path, cold_ids))}")
+            print(f"  Cache caliente: {summary(measure_warm(path, warm_ids))}")
+
+
+if __name__ == "__main__":
+    main()
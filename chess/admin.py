@@ -9,6 +9,7 @@ from .models import (
     ThemeElo,
     PuzzleAttempt,
     ActiveExercise,
+    QueuedPuzzle,
     RetryPuzzle,
 )
 
@@ -159,6 +160,7 @@ class PuzzleAttemptAdmin(admin.ModelAdmin):
     list_display = (
         "user",
         "puzzle_id",
+        "puzzle_rating",
         "solved",
         "created_at",
     )
@@ -172,13 +174,22 @@ class PuzzleAttemptAdmin(admin.ModelAdmin):
 
 @admin.register(ActiveExercise)
 class ActiveExerciseAdmin(admin.ModelAdmin):
-    list_display = ("user", "puzzle_id", "created_at")
+    list_display = ("user", "puzzle_id", "puzzle_rating", "created_at")
     search_fields = ("user__username", "puzzle_id")
     readonly_fields = ("created_at",)
     autocomplete_fields = ("user",)
     list_select_related = ("user",)
 
 
+@admin.register(QueuedPuzzle)
+class QueuedPuzzleAdmin(admin.ModelAdmin):
+    list_display = ("user", "position", "puzzle_id", "theme", "target_elo", "created_at")
+    search_fields = ("user__username", "puzzle_id")
+    readonly_fields = ("created_at",)
+    autocomplete_fields = ("user", "theme")
+    list_select_related = ("user", "theme")
+
+
 @admin.register(RetryPuzzle)
 class RetryPuzzleAdmin(admin.ModelAdmin):
     list_display = (
@@ -186,6 +197,9 @@ class RetryPuzzleAdmin(admin.ModelAdmin):
         "puzzle_id",
         "theme",
         "fail_count",
+        "due_at",
+        "interval",
+        "ease",
         "last_attempt_at",
     )
     list_filter = ("theme",)
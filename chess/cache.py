@@ -0,0 +1,70 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Cache LRU en memoria, acotada por tamaño y con TTL opcional.
+
+    - Thread-safe (un lock por instancia)
+    - Contadores de hits / misses / evictions
+    - clear() para invalidar todo (p. ej. al cambiar la base de puzzles)
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+
+            if item is not None:
+                value, expires_at = item
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+
+                # Expirado
+                del self._data[key]
+
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+
+        expires_at = None
+        if self.ttl:
+            expires_at = time.monotonic() + self.ttl
+
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,69 @@
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import TrainingCycle
+from .utils import get_week_cycle_dates
+
+
+def cycle_cache_timeout():
+    return getattr(settings, "TRAINING_CYCLE_CACHE_TIMEOUT", 7 * 24 * 60 * 60)
+
+
+def cycle_cache_key(user_id, day):
+    # Semana ISO: coincide con el ciclo lunes-domingo
+    year, week, _ = day.isocalendar()
+    return f"training_cycle:{user_id}:{year}-W{week:02d}"
+
+
+def get_current_cycle(user, today=None, for_update=False):
+    """
+    (cycle, cycle_themes) de la semana de today.
+
+    cycle_themes es una lista de TrainingCycleTheme (con theme
+    cargado) ordenada por prioridad. Se cachea por usuario y semana
+    junto al id del ciclo; la fila del ciclo (completed_puzzles
+    cambia en cada submit) se lee siempre de la base, por pk.
+    Con for_update esa lectura bloquea la fila.
+    """
+    today = today or date.today()
+    key = cycle_cache_key(user.pk, today)
+
+    cycles = TrainingCycle.objects.all()
+    if for_update:
+        cycles = cycles.select_for_update()
+
+    cached = cache.get(key)
+    if cached is not None:
+        cycle_id, cycle_themes = cached
+        cycle = cycles.filter(
+            pk=cycle_id, user=user, start_date__lte=today, end_date__gte=today
+        ).first()
+        if cycle is not None:
+            return cycle, cycle_themes
+
+    start_date, end_date = get_week_cycle_dates(today)
+
+    # El ciclo se autocrea y configura vía signals
+    cycle, _ = cycles.get_or_create(
+        user=user,
+        start_date=start_date,
+        end_date=end_date,
+    )
+
+    cycle_themes = list(
+        cycle.themes
+        .select_related("theme")
+        .order_by("priority")
+    )
+
+    cache.set(key, (cycle.pk, cycle_themes), cycle_cache_timeout())
+    return cycle, cycle_themes
+
+
+def invalidate_cycle(user_id, day):
+    # Tras el commit: un rollback no deja la cache con datos que no existen
+    key = cycle_cache_key(user_id, day)
+    transaction.on_commit(lambda: cache.delete(key))
@@ -0,0 +1,27 @@
+"""
+Fórmulas de Elo sin estado: las usan BaseElo y replay_elos.
+"""
+import math
+
+
+INITIAL_ELO = 1500
+
+
+def expected_score(elo, opponent_elo):
+    return 1 / (1 + math.pow(10, (opponent_elo - elo) / 400))
+
+
+def k_factor(elo, puzzles_played):
+    if puzzles_played < 30:
+        return 40
+    if elo < 2000:
+        return 20
+    return 10
+
+
+def next_elo(elo, puzzles_played, opponent_elo, score):
+    """
+    Elo tras un resultado (score: 1.0 resuelto, 0.0 fallado).
+    """
+    k = k_factor(elo, puzzles_played)
+    return round(elo + k * (score - expected_score(elo, opponent_elo)))
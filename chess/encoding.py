@@ -0,0 +1,158 @@
+"""
+Codificación compacta de FEN y jugadas UCI para la base de puzzles.
+
+Sin dependencias de Django: la usan el importador y el repositorio.
+
+FEN (bytes):
+    8 bytes  ocupación (bit i = casilla i, a1 = 0 ... h8 = 63)
+    2 bytes  flags: bando (bit 0), enroques KQkq (bits 1-4),
+             columna de al paso + 1 (bits 5-8, 0 = ninguna)
+    1 byte   reloj de medias jugadas
+    2 bytes  número de jugada
+    n/2      una pieza por nibble, en orden de casilla
+
+Jugadas: 2 bytes cada una (origen 6 bits, destino 6 bits, coronación 3 bits).
+"""
+import struct
+
+
+PIECES = "PNBRQKpnbrqk"
+PIECE_CODES = {piece: code for code, piece in enumerate(PIECES)}
+
+CASTLING = "KQkq"
+PROMOTIONS = " nbrq"
+
+SQUARES = [f"{'abcdefgh'[i % 8]}{i // 8 + 1}" for i in range(64)]
+SQUARE_INDEX = {name: i for i, name in enumerate(SQUARES)}
+
+FEN_HEADER = struct.Struct(">QHBH")
+
+
+def _rank_format(occupied):
+    # "2{}3{}{}1": huecos como dígitos, una plantilla por byte de ocupación
+    fmt = ""
+    empty = 0
+    for file in range(8):
+        if occupied >> file & 1:
+            if empty:
+                fmt += str(empty)
+                empty = 0
+            fmt += "{}"
+        else:
+            empty += 1
+    if empty:
+        fmt += str(empty)
+    return fmt, bin(occupied).count("1")
+
+
+# Tablas precalculadas: la decodificación es lo que se hace en cada lectura
+RANK_FORMATS = [_rank_format(occupied) for occupied in range(256)]
+NIBBLE_PIECES = [
+    PIECES[(byte >> 4) % 12] + PIECES[(byte & 15) % 12] for byte in range(256)
+]
+
+
+def pack_fen(fen):
+    """
+    FEN -> bytes. ValueError si la posición no se puede
+    representar exactamente (se guarda entonces como texto).
+    """
+    try:
+        board, side, castling, ep, halfmove, fullmove = fen.split(" ")
+
+        # Filas de la 1 a la 8: las piezas salen en orden de casilla
+        occupancy = 0
+        codes = []
+        for rank, row in enumerate(reversed(board.split("/"))):
+            file = 0
+            for char in row:
+                if char.isdigit():
+                    file += int(char)
+                else:
+                    occupancy |= 1 << (rank * 8 + file)
+                    codes.append(PIECE_CODES[char])
+                    file += 1
+
+        flags = side == "b"
+        if castling != "-":
+            for char in castling:
+                flags |= 1 << (CASTLING.index(char) + 1)
+        if ep != "-":
+            flags |= ("abcdefgh".index(ep[0]) + 1) << 5
+
+        if len(codes) % 2:
+            codes.append(0)
+        pieces = bytes(hi << 4 | lo for hi, lo in zip(codes[::2], codes[1::2]))
+
+        data = FEN_HEADER.pack(occupancy, flags, int(halfmove), int(fullmove)) + pieces
+    except (KeyError, IndexError, ValueError, struct.error) as exc:
+        raise ValueError(f"FEN no codificable: {fen}") from exc
+
+    if unpack_fen(data) != fen:
+        raise ValueError(f"FEN no canónico: {fen}")
+    return data
+
+
+def unpack_fen(data):
+    occupancy, flags, halfmove, fullmove = FEN_HEADER.unpack_from(data)
+
+    pieces = "".join(map(NIBBLE_PIECES.__getitem__, data[FEN_HEADER.size:]))
+
+    # Las piezas van de a1 a h8; el FEN se escribe de la fila 8 a la 1
+    rows = []
+    start = 0
+    for rank in range(8):
+        fmt, count = RANK_FORMATS[occupancy >> (rank * 8) & 255]
+        rows.append(fmt.format(*pieces[start:start + count]))
+        start += count
+    rows.reverse()
+
+    side = "b" if flags & 1 else "w"
+    castling = "".join(
+        char for i, char in enumerate(CASTLING) if flags >> (i + 1) & 1
+    ) or "-"
+
+    ep = "-"
+    ep_file = flags >> 5 & 15
+    if ep_file:
+        # La casilla de al paso queda detrás del peón que acaba de avanzar
+        ep = "abcdefgh"[ep_file - 1] + ("3" if side == "b" else "6")
+
+    return f"{'/'.join(rows)} {side} {castling} {ep} {halfmove} {fullmove}"
+
+
+def pack_moves(moves):
+    """
+    "e2e4 e7e8q" -> bytes (2 por jugada). ValueError si alguna
+    jugada no es UCI estándar.
+    """
+    values = []
+    try:
+        for move in moves.split():
+            if len(move) not in (4, 5):
+                raise ValueError(move)
+            promotion = PROMOTIONS.index(move[4]) if len(move) == 5 else 0
+            if len(move) == 5 and not promotion:
+                raise ValueError(move)
+            values.append(
+                SQUARE_INDEX[move[:2]]
+                | SQUARE_INDEX[move[2:4]] << 6
+                | promotion << 12
+            )
+    except (KeyError, ValueError) as exc:
+        raise ValueError(f"Jugadas no codificables: {moves}") from exc
+
+    return struct.pack(f">{len(values)}H", *values)
+
+
+def unpack_moves(data):
+    """
+    bytes -> lista de jugadas UCI.
+    """
+    moves = []
+    for (value,) in struct.iter_unpack(">H", data):
+        move = SQUARES[value & 63] + SQUARES[value >> 6 & 63]
+        if value >> 12:
+            move += PROMOTIONS[value >> 12]
+        moves.append(move)
+    return moves
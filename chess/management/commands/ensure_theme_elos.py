@@ -1,39 +1,90 @@
+import time
+
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.utils import timezone
 
+from chess.elo import INITIAL_ELO
 from chess.models import Theme
 from chess.models import ThemeElo
+from chess.overview_cache import invalidate_all_overviews
+
+
+# Pares (usuario, tema) que faltan, para un rango de ids de usuario.
+# NOT EXISTS usa el índice único (user_id, theme_id) de ThemeElo.
+INSERT_MISSING_SQL = """
+    INSERT INTO {theme_elo} (user_id, theme_id, elo, puzzles_played,
+                             last_updated, last_trained)
+    SELECT u.{user_pk}, t.{theme_pk}, %s, 0, %s, %s
+    FROM {user} u
+    CROSS JOIN {theme} t
+    WHERE u.{user_pk} >= %s AND u.{user_pk} <= %s
+      AND NOT EXISTS (
+          SELECT 1
+          FROM {theme_elo} te
+          WHERE te.user_id = u.{user_pk}
+            AND te.theme_id = t.{theme_pk}
+      )
+"""
 
 
 class Command(BaseCommand):
     help = "Ensure that all users have ThemeElo for all themes"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Usuarios por INSERT ... SELECT",
+        )
+
     def handle(self, *args, **options):
         User = get_user_model()
-        users = User.objects.all()
-        themes = Theme.objects.all()
+        qn = connection.ops.quote_name
+
+        sql = INSERT_MISSING_SQL.format(
+            theme_elo=qn(ThemeElo._meta.db_table),
+            user=qn(User._meta.db_table),
+            user_pk=qn(User._meta.pk.column),
+            theme=qn(Theme._meta.db_table),
+            theme_pk=qn(Theme._meta.pk.column),
+        )
+
+        # Lo mismo que guardaría bulk_create (auto_now en ambos campos)
+        now = ThemeElo._meta.get_field("last_updated").get_db_prep_value(
+            timezone.now(), connection
+        )
 
+        user_ids = list(
+            User.objects.order_by("pk").values_list("pk", flat=True)
+        )
+        chunk_size = options["chunk_size"]
+
+        started = time.perf_counter()
         created_total = 0
 
-        for user in users:
-            missing_themes = themes.exclude(
-                themeelo__user=user
-            )
+        for i in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[i:i + chunk_size]
 
-            elos = [
-                ThemeElo(user=user, theme=theme)
-                for theme in missing_themes
-            ]
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(sql, [INITIAL_ELO, now, now, chunk[0], chunk[-1]])
+                created_total += cursor.rowcount
 
-            ThemeElo.objects.bulk_create(
-                elos,
-                ignore_conflicts=True
+            self.stdout.write(
+                f"Usuarios {i + len(chunk)}/{len(user_ids)} | "
+                f"ThemeElo creados: {created_total} | "
+                f"{time.perf_counter() - started:.2f}s"
             )
 
-            created_total += len(elos)
+        if created_total:
+            # Los fragmentos cacheados no conocen las filas nuevas
+            invalidate_all_overviews()
 
         self.stdout.write(
             self.style.SUCCESS(
-                f"ThemeElo creados: {created_total}"
+                f"ThemeElo creados: {created_total} "
+                f"en {time.perf_counter() - started:.2f}s"
             )
         )
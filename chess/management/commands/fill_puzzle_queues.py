@@ -0,0 +1,40 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from chess.models import TrainingCycle
+from chess.puzzle_queue import fill_queue
+from chess.repository import LichessDB
+from chess.utils import get_week_cycle_dates
+
+
+class Command(BaseCommand):
+    help = "Fill every user's puzzle queue for the current cycle (cron / background)"
+
+    def handle(self, *args, **options):
+        start_date, end_date = get_week_cycle_dates(date.today())
+        db = LichessDB()
+
+        cycles = (
+            TrainingCycle.objects
+            .filter(start_date=start_date, end_date=end_date)
+            .select_related("user")
+        )
+
+        users = 0
+        added_total = 0
+
+        for cycle in cycles:
+            added = fill_queue(
+                cycle.user,
+                cycle.themes.select_related("theme"),
+                db,
+            )
+            users += 1
+            added_total += added
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Colas revisadas: {users} | puzzles añadidos: {added_total}"
+            )
+        )
@@ -0,0 +1,230 @@
+import time
+from array import array
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from chess.elo import INITIAL_ELO, next_elo
+from chess.models import Elo, PuzzleAttempt, ThemeElo
+from chess.overview_cache import invalidate_overview
+from chess.repository import LichessDB
+from chess.theme_tree import get_theme_node, get_theme_tree
+
+
+GENERAL = None  # theme_id de la clave (user_id, theme_id) para el Elo general
+
+
+class Command(BaseCommand):
+    help = "Rebuild Elo and ThemeElo by replaying the PuzzleAttempt history"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="No escribe nada; muestra el diff con los Elos actuales",
+        )
+        parser.add_argument(
+            "--user",
+            action="append",
+            dest="usernames",
+            help="Limitar a este usuario (se puede repetir)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Intentos por lote (un lookup en la base de Lichess por lote)",
+        )
+        parser.add_argument(
+            "--show",
+            type=int,
+            default=20,
+            help="Filas del diff a mostrar (las de mayor diferencia)",
+        )
+
+    def handle(self, *args, **options):
+        attempts = PuzzleAttempt.objects.order_by("created_at", "pk")
+        elos = Elo.objects.all()
+        theme_elos = ThemeElo.objects.all()
+
+        if options["usernames"]:
+            users = get_user_model().objects.filter(
+                username__in=options["usernames"]
+            )
+            unknown = set(options["usernames"]) - set(
+                users.values_list("username", flat=True)
+            )
+            if unknown:
+                raise CommandError(f"Usuarios inexistentes: {', '.join(sorted(unknown))}")
+
+            attempts = attempts.filter(user__in=users)
+            elos = elos.filter(user__in=users)
+            theme_elos = theme_elos.filter(user__in=users)
+
+        # =========================
+        # REPLAY
+        # =========================
+        started = time.perf_counter()
+        slots, elo, played, stats = self.replay(
+            attempts.values_list(
+                "user_id", "puzzle_id", "solved", "puzzle_rating", "theme_ids"
+            ),
+            options["batch_size"],
+        )
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"Intentos: {stats['attempts']} | sin puzzle en la base: "
+            f"{stats['missing']} | lookup {stats['lookup']:.2f}s | "
+            f"recurrencia {stats['loop']:.2f}s | total {elapsed:.2f}s "
+            f"({stats['attempts'] / elapsed if elapsed else 0:,.0f} intentos/s)"
+        )
+
+        # =========================
+        # DIFF
+        # =========================
+        # Las filas sin intentos vuelven al valor inicial
+        changed = []
+        for model, rows in ((Elo, elos), (ThemeElo, theme_elos)):
+            for row in rows.iterator(chunk_size=options["batch_size"]):
+                key = (row.user_id, getattr(row, "theme_id", GENERAL))
+                slot = slots.get(key)
+                new = (
+                    (elo[slot], played[slot])
+                    if slot is not None
+                    else (INITIAL_ELO, 0)
+                )
+                if new != (row.elo, row.puzzles_played):
+                    changed.append((model, row, new))
+
+        self.report(changed, options["show"])
+
+        if options["dry_run"]:
+            self.stdout.write(self.style.WARNING("Dry run: no se guardó nada"))
+            return
+
+        # =========================
+        # ESCRITURA
+        # =========================
+        now = timezone.now()
+        with transaction.atomic():
+            for model in (Elo, ThemeElo):
+                rows = []
+                for row_model, row, (new_elo, new_played) in changed:
+                    if row_model is model:
+                        row.elo = new_elo
+                        row.puzzles_played = new_played
+                        row.last_updated = now
+                        rows.append(row)
+
+                model.objects.bulk_update(
+                    rows,
+                    model.UPDATE_FIELDS,
+                    batch_size=options["batch_size"],
+                )
+
+            # bulk_update no envía post_save
+            for user_id in {row.user_id for _, row, _ in changed}:
+                invalidate_overview(user_id)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Elos actualizados: {len(changed)}")
+        )
+
+    def replay(self, attempts, batch_size):
+        """
+        Recurrencia de Elo sobre los intentos en orden cronológico.
+
+        El estado vive en dos arrays (elo, partidas jugadas) indexados
+        por slot; slots mapea (user_id, theme_id) -> slot, con theme_id
+        GENERAL para el Elo general.
+
+        Rating y temas salen del propio intento; la base de Lichess
+        solo se consulta para intentos anteriores a guardarlos.
+        """
+        db = LichessDB()
+        tree = get_theme_tree()
+
+        slots = {}
+        elo = array("i")
+        played = array("i")
+        stats = {"attempts": 0, "missing": 0, "lookup": 0.0, "loop": 0.0}
+
+        rows = attempts.iterator(chunk_size=batch_size)
+        while batch := list(islice(rows, batch_size)):
+            started = time.perf_counter()
+            puzzles, _ = db.get_puzzles_by_ids([
+                puzzle_id
+                for _, puzzle_id, _, rating, _ in batch
+                if rating is None
+            ])
+            # puzzle_id -> (rating, theme_ids); themes con el mismo
+            # mapeo lichess_name -> Theme que _record_result
+            lookup = {
+                puzzle.puzzle_id: (
+                    puzzle.rating,
+                    tree.ids_for_lichess_names(puzzle.themes),
+                )
+                for puzzle in puzzles
+            }
+            stats["lookup"] += time.perf_counter() - started
+
+            started = time.perf_counter()
+            for user_id, puzzle_id, solved, rating, theme_ids in batch:
+                if rating is None:
+                    puzzle = lookup.get(puzzle_id)
+                    if puzzle is None:
+                        stats["missing"] += 1
+                        continue
+                    rating, theme_ids = puzzle
+
+                score = 1.0 if solved else 0.0
+
+                for theme_id in (GENERAL, *theme_ids):
+                    slot = slots.get((user_id, theme_id))
+                    if slot is None:
+                        slot = slots[(user_id, theme_id)] = len(elo)
+                        elo.append(INITIAL_ELO)
+                        played.append(0)
+
+                    elo[slot] = next_elo(elo[slot], played[slot], rating, score)
+                    played[slot] += 1
+
+            stats["attempts"] += len(batch)
+            stats["loop"] += time.perf_counter() - started
+
+        return slots, elo, played, stats
+
+    def report(self, changed, show):
+        if not changed:
+            self.stdout.write("Sin diferencias")
+            return
+
+        users = dict(
+            get_user_model().objects
+            .filter(pk__in={row.user_id for _, row, _ in changed})
+            .values_list("pk", "username")
+        )
+
+        deltas = [abs(new[0] - row.elo) for _, row, new in changed]
+        self.stdout.write(
+            f"Filas con cambios: {len(changed)} | diferencia media "
+            f"{sum(deltas) / len(deltas):.1f} | máxima {max(deltas)}"
+        )
+
+        changed = sorted(changed, key=lambda c: abs(c[2][0] - c[1].elo), reverse=True)
+        for model, row, (new_elo, new_played) in changed[:show]:
+            if model is Elo:
+                name = "General"
+            else:
+                # El snapshot puede ser anterior a los temas de los intentos
+                node = get_theme_node(row.theme_id)
+                name = node.name if node else row.theme.name
+            self.stdout.write(
+                f"  {users[row.user_id]:<20} {name:<25} "
+                f"{row.elo:>5} -> {new_elo:<5} "
+                f"({row.puzzles_played} -> {new_played} puzzles)"
+            )
@@ -0,0 +1,18 @@
+from .repository import LichessDB
+
+
+class LichessDBMiddleware:
+    """
+    Aplica el snapshot vigente de la base de puzzles al inicio
+    de cada request y lo mantiene fijo hasta que termina.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        LichessDB.begin_request()
+        try:
+            return self.get_response(request)
+        finally:
+            LichessDB.end_request()
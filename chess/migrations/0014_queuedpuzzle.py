@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-16 22:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chess', '0013_alter_trainingcycle_total_puzzles'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedPuzzle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('puzzle_id', models.CharField(max_length=100)),
+                ('target_elo', models.IntegerField(blank=True, help_text='Elo del tema cuando se eligió', null=True)),
+                ('position', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('theme', models.ForeignKey(blank=True, help_text='Tema del ciclo por el que se eligió (vacío = retry)', null=True, on_delete=django.db.models.deletion.CASCADE, to='chess.theme')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='queued_puzzles', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'position'], name='chess_queue_user_id_b8e5d7_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'puzzle_id'), name='unique_queued_puzzle')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-16 23:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chess', '0014_queuedpuzzle'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activeexercise',
+            name='puzzle_rating',
+            field=models.IntegerField(blank=True, help_text='Rating del puzzle (vacío = leerlo de la base de Lichess)', null=True),
+        ),
+        migrations.AddField(
+            model_name='activeexercise',
+            name='theme_ids',
+            field=models.JSONField(blank=True, default=list, help_text='ids de Theme del puzzle'),
+        ),
+        migrations.AddField(
+            model_name='puzzleattempt',
+            name='puzzle_rating',
+            field=models.IntegerField(blank=True, help_text='Rating del puzzle cuando se sirvió', null=True),
+        ),
+        migrations.AddField(
+            model_name='puzzleattempt',
+            name='theme_ids',
+            field=models.JSONField(blank=True, default=list, help_text='ids de Theme del puzzle cuando se sirvió'),
+        ),
+    ]
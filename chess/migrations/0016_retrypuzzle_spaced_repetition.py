@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-16 23:02
+
+import datetime
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chess', '0015_activeexercise_puzzle_rating_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='retrypuzzle',
+            name='due_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='Cuándo toca repetirlo'),
+        ),
+        migrations.AddField(
+            model_name='retrypuzzle',
+            name='ease',
+            field=models.FloatField(default=2.5, help_text='Factor por el que crece el intervalo al resolverlo'),
+        ),
+        migrations.AddField(
+            model_name='retrypuzzle',
+            name='interval',
+            field=models.DurationField(default=datetime.timedelta(days=1), help_text='Espera actual hasta la siguiente repetición'),
+        ),
+        migrations.AddIndex(
+            model_name='retrypuzzle',
+            index=models.Index(fields=['user', 'due_at'], name='chess_retry_user_id_d4119b_idx'),
+        ),
+    ]
@@ -1,9 +1,11 @@
+from datetime import timedelta
+
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 
-import math
+from . import elo as elo_formulas
 
 
 class TrainingPreferences(models.Model):
@@ -117,7 +119,7 @@ class TrainingCycleTheme(models.Model):
 
 
 class BaseElo(models.Model):
-    elo = models.IntegerField(default=1500)
+    elo = models.IntegerField(default=elo_formulas.INITIAL_ELO)
     puzzles_played = models.PositiveIntegerField(default=0)
     last_updated = models.DateTimeField(auto_now=True)
 
@@ -125,22 +127,46 @@ class BaseElo(models.Model):
         abstract = True
 
     def expected_score(self, opponent_elo: int) -> float:
-        return 1 / (1 + math.pow(10, (opponent_elo - self.elo) / 400))
+        return elo_formulas.expected_score(self.elo, opponent_elo)
 
     def k_factor(self) -> int:
-        if self.puzzles_played < 30:
-            return 40
-        if self.elo < 2000:
-            return 20
-        return 10
+        return elo_formulas.k_factor(self.elo, self.puzzles_played)
 
-    def update_elo(self, opponent_elo: int, score: float):
-        expected = self.expected_score(opponent_elo)
-        k = self.k_factor()
+    UPDATE_FIELDS = ["elo", "puzzles_played", "last_updated"]
 
-        self.elo = round(self.elo + k * (score - expected))
+    def apply_result(self, opponent_elo: int, score: float):
+        # Solo en memoria; update_elo / bulk_update_elo lo guardan
+        self.elo = elo_formulas.next_elo(
+            self.elo, self.puzzles_played, opponent_elo, score
+        )
         self.puzzles_played += 1
-        self.save(update_fields=["elo", "puzzles_played", "last_updated"])
+
+    def update_elo(self, opponent_elo: int, score: float):
+        self.apply_result(opponent_elo, score)
+        self.save(update_fields=self.UPDATE_FIELDS)
+
+    @classmethod
+    def bulk_update_elo(cls, ratings, opponent_elo: int, score: float):
+        """
+        update_elo para varios registros con un solo UPDATE.
+        Devuelve [(registro, elo anterior)].
+
+        bulk_update no aplica auto_now ni envía post_save.
+        """
+        now = timezone.now()
+        changes = []
+
+        for rating in ratings:
+            changes.append((rating, rating.elo))
+            rating.apply_result(opponent_elo, score)
+            rating.last_updated = now
+
+        if changes:
+            cls.objects.bulk_update(
+                [rating for rating, _ in changes],
+                cls.UPDATE_FIELDS,
+            )
+        return changes
 
 
 class Elo(BaseElo):
@@ -195,6 +221,16 @@ class PuzzleAttempt(models.Model):
     )
     puzzle_id = models.CharField(max_length=100)
     solved = models.BooleanField()
+    puzzle_rating = models.IntegerField(
+        null=True,
+        blank=True,
+        help_text="Rating del puzzle cuando se sirvió"
+    )
+    theme_ids = models.JSONField(
+        default=list,
+        blank=True,
+        help_text="ids de Theme del puzzle cuando se sirvió"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -214,8 +250,56 @@ class ActiveExercise(models.Model):
         related_name="active_exercise"
     )
     puzzle_id = models.CharField(max_length=100)
+    # Copiados al servir el puzzle: el submit no vuelve a leer la base de Lichess
+    puzzle_rating = models.IntegerField(
+        null=True,
+        blank=True,
+        help_text="Rating del puzzle (vacío = leerlo de la base de Lichess)"
+    )
+    theme_ids = models.JSONField(
+        default=list,
+        blank=True,
+        help_text="ids de Theme del puzzle"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class QueuedPuzzle(models.Model):
+    """
+    Cola de puzzles preseleccionados por usuario (se sirven por position)
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="queued_puzzles"
+    )
+    puzzle_id = models.CharField(max_length=100)
+    theme = models.ForeignKey(
+        Theme,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        help_text="Tema del ciclo por el que se eligió (vacío = retry)"
+    )
+    target_elo = models.IntegerField(
+        null=True,
+        blank=True,
+        help_text="Elo del tema cuando se eligió"
+    )
+    position = models.PositiveIntegerField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "puzzle_id"],
+                name="unique_queued_puzzle"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["user", "position"]),
+        ]
+
 
 class RetryPuzzle(models.Model):
     """
@@ -233,6 +317,20 @@ class RetryPuzzle(models.Model):
     fail_count = models.PositiveIntegerField(default=0)
     last_attempt_at = models.DateTimeField(auto_now=True)
 
+    # Repetición espaciada (ver retries.py)
+    due_at = models.DateTimeField(
+        default=timezone.now,
+        help_text="Cuándo toca repetirlo"
+    )
+    interval = models.DurationField(
+        default=timedelta(days=1),
+        help_text="Espera actual hasta la siguiente repetición"
+    )
+    ease = models.FloatField(
+        default=2.5,
+        help_text="Factor por el que crece el intervalo al resolverlo"
+    )
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -240,6 +338,9 @@ class RetryPuzzle(models.Model):
                 name="unique_retry_puzzle"
             )
         ]
+        indexes = [
+            models.Index(fields=["user", "due_at"]),
+        ]
 
 
 """
@@ -0,0 +1,124 @@
+import time
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .models import Elo, ThemeElo
+from .theme_tree import get_theme_tree
+
+
+# Se incrementa cuando cambian los Theme: invalida los fragmentos de todos
+GENERATION_KEY = "theme_overview:generation"
+
+# Con una cache por proceso (LocMemCache) las invalidaciones solo
+# llegan al worker que las hace: el fragmento vive poco
+LOCAL_CACHE_TIMEOUT = 5 * 60
+
+
+def overview_cache_timeout():
+    timeout = getattr(settings, "THEME_OVERVIEW_CACHE_TIMEOUT", 24 * 60 * 60)
+    if isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache):
+        if timeout is None:
+            return LOCAL_CACHE_TIMEOUT
+        return min(timeout, LOCAL_CACHE_TIMEOUT)
+    return timeout
+
+
+def new_generation():
+    # Si la clave se perdió (cull, reinicio de la cache) no se
+    # reutiliza una generación con fragmentos viejos
+    return time.time_ns() // 1000
+
+
+def overview_cache_key(user_id):
+    generation = cache.get_or_set(GENERATION_KEY, new_generation, None)
+    return f"theme_overview:{user_id}:{generation}"
+
+
+def build_theme_overview(user):
+    """
+    Categorías entrenables y no entrenables con los Elos del usuario.
+
+    Una query de ThemeElo (la jerarquía sale de ThemeTree) y la
+    agrupación en Python: el coste no crece con el número de temas.
+    """
+    tree = get_theme_tree()
+    elos = dict(
+        ThemeElo.objects
+        .filter(user=user)
+        .values_list("theme_id", "elo")
+    )
+
+    def with_elo(node):
+        return dict(node._asdict(), elo=elos.get(node.id))
+
+    trainable_categories = []
+    non_trainable_categories = []
+
+    for category in tree.categories:
+        subthemes = tree.children.get(category.id, ())
+
+        trainable = [with_elo(t) for t in subthemes if t.is_trainable]
+        if trainable:
+            trainable_categories.append(
+                dict(with_elo(category), themes=trainable)
+            )
+
+        non_trainable = [with_elo(t) for t in subthemes if not t.is_trainable]
+        if non_trainable:
+            non_trainable_categories.append(
+                dict(with_elo(category), themes=non_trainable)
+            )
+
+    return trainable_categories, non_trainable_categories
+
+
+def get_theme_overview(user):
+    """
+    HTML del resumen de temas, cacheado por usuario. Las signals
+    lo invalidan cuando cambia su Elo o alguno de sus ThemeElo.
+    """
+    key = overview_cache_key(user.pk)
+
+    html = cache.get(key)
+    if html is not None:
+        return mark_safe(html)
+
+    trainable_categories, non_trainable_categories = build_theme_overview(user)
+    general_elo = (
+        Elo.objects
+        .filter(user=user)
+        .values_list("elo", flat=True)
+        .first()
+    )
+
+    html = render_to_string(
+        "theme_overview_content.html",
+        {
+            "general_elo": general_elo,
+            "trainable_categories": trainable_categories,
+            "non_trainable_categories": non_trainable_categories,
+        },
+    )
+    cache.set(key, str(html), overview_cache_timeout())
+    return mark_safe(html)
+
+
+def invalidate_overview(user_id):
+    # Tras el commit, como invalidate_cycle
+    transaction.on_commit(lambda: cache.delete(overview_cache_key(user_id)))
+
+
+def invalidate_all_overviews():
+    def bump():
+        # incr falla si la clave expiró o no existe
+        try:
+            cache.incr(GENERATION_KEY)
+        except ValueError:
+            cache.set(GENERATION_KEY, new_generation(), None)
+
+    transaction.on_commit(bump)
@@ -0,0 +1,165 @@
+import random
+
+from django.conf import settings
+
+from .models import ActiveExercise, QueuedPuzzle, ThemeElo
+from .retries import due_retries
+from .utils import pick_cycle_theme
+
+
+def queue_settings():
+    return (
+        getattr(settings, "PUZZLE_QUEUE_SIZE", 10),
+        getattr(settings, "PUZZLE_QUEUE_REFILL", 2),
+        getattr(settings, "PUZZLE_QUEUE_ELO_DRIFT", 100),
+    )
+
+
+def get_theme_elos(user, cycle_themes):
+    """
+    theme_id -> elo de los temas del ciclo (una query).
+    """
+    return dict(
+        ThemeElo.objects
+        .filter(user=user, theme_id__in=[ct.theme_id for ct in cycle_themes])
+        .values_list("theme_id", "elo")
+    )
+
+
+def fill_queue(user, cycle_themes, db, limit=None, theme_elos=None):
+    """
+    Completa la cola del usuario hasta PUZZLE_QUEUE_SIZE
+    (o añade como mucho limit puzzles).
+
+    Misma selección que un puzzle suelto: retry vencido con un 10%
+    de probabilidad, si no, tema del ciclo por peso + rating cercano
+    al Elo del tema. Devuelve cuántos se añadieron.
+    """
+    cycle_themes = list(cycle_themes)
+    if not cycle_themes:
+        return 0
+
+    size, _, _ = queue_settings()
+    queued = list(
+        QueuedPuzzle.objects
+        .filter(user=user)
+        .values_list("puzzle_id", "position")
+    )
+
+    missing = size - len(queued)
+    if limit is not None:
+        missing = min(missing, limit)
+    if missing <= 0:
+        return 0
+
+    if theme_elos is None:
+        theme_elos = get_theme_elos(user, cycle_themes)
+
+    # Sin repetir lo que ya está en cola ni el puzzle activo
+    seen = {puzzle_id for puzzle_id, _ in queued}
+    seen.update(
+        ActiveExercise.objects
+        .filter(user=user)
+        .values_list("puzzle_id", flat=True)
+    )
+
+    # Los retries vencidos se leen solo si el sorteo los pide
+    retries = None
+
+    position = max((p for _, p in queued), default=0)
+    entries = []
+
+    # Intentos acotados: un tema sin puzzles no bloquea el resto
+    for _ in range(missing * 3):
+        if len(entries) >= missing:
+            break
+
+        if retries != [] and random.random() < 0.1:
+            if retries is None:
+                retries = due_retries(user, missing, exclude=seen)
+            if retries:
+                puzzle_id = retries.pop(0)
+                entries.append(QueuedPuzzle(user=user, puzzle_id=puzzle_id))
+                seen.add(puzzle_id)
+                continue
+
+        cycle_theme = pick_cycle_theme(cycle_themes)
+        elo = theme_elos.get(cycle_theme.theme_id)
+        if elo is None:
+            continue
+
+        puzzle = db.get_nearest_puzzle(
+            elo,
+            max_spread=300,
+            themes=[cycle_theme.theme.lichess_name],
+        )
+        if not puzzle or puzzle.puzzle_id in seen:
+            continue
+
+        entries.append(
+            QueuedPuzzle(
+                user=user,
+                puzzle_id=puzzle.puzzle_id,
+                theme_id=cycle_theme.theme_id,
+                target_elo=elo,
+            )
+        )
+        seen.add(puzzle.puzzle_id)
+
+    for entry in entries:
+        position += 1
+        entry.position = position
+
+    QueuedPuzzle.objects.bulk_create(entries, ignore_conflicts=True)
+    return len(entries)
+
+
+def pop_puzzle(user, cycle_themes, db):
+    """
+    Saca el primer puzzle válido de la cola (None si no hay ninguno).
+
+    Se descartan las entradas cuyo tema ya no es del ciclo o cuyo
+    Elo de tema se movió más de PUZZLE_QUEUE_ELO_DRIFT desde que se
+    eligieron; si la cola queda vacía se añade en el momento solo un
+    puzzle (los submits lo llaman dentro de su transacción: el resto
+    lo repone refill_queue tras el commit).
+    """
+    cycle_themes = list(cycle_themes)
+    _, _, drift = queue_settings()
+    theme_elos = get_theme_elos(user, cycle_themes)
+
+    for _ in range(2):
+        entries = QueuedPuzzle.objects.filter(user=user).order_by("position")
+        discarded = []
+        puzzle = None
+
+        for entry in entries:
+            if entry.theme_id is not None:
+                elo = theme_elos.get(entry.theme_id)
+                if elo is None or abs(elo - entry.target_elo) > drift:
+                    discarded.append(entry.pk)
+                    continue
+
+            if puzzle is None:
+                discarded.append(entry.pk)
+                # None si el puzzle ya no está en el snapshot activo
+                puzzle = db.get_puzzle_by_id(entry.puzzle_id)
+
+        if discarded:
+            QueuedPuzzle.objects.filter(pk__in=discarded).delete()
+        if puzzle:
+            return puzzle
+
+        if not fill_queue(user, cycle_themes, db, limit=1, theme_elos=theme_elos):
+            return None
+
+    return None
+
+
+def refill_queue(user, cycle_themes, db):
+    """
+    Reposición tras un submit: como mucho PUZZLE_QUEUE_REFILL puzzles,
+    así el coste por request se mantiene constante.
+    """
+    _, refill, _ = queue_settings()
+    return fill_queue(user, cycle_themes, db, limit=refill)
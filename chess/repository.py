@@ -1,167 +1,698 @@
-import sqlite3
+import json
+import os
 import random
+import sqlite3
+import threading
 from pathlib import Path
 from django.conf import settings
 
+from .cache import LRUCache
+from .encoding import unpack_fen, unpack_moves
+
+
+_UNLOADED = object()
+
+
+class Puzzle:
+    """
+    Puzzle de Lichess (valor compacto, sin __dict__).
+
+    - orientation, side_to_move y plies vienen precalculados del import
+    - fen y moves se decodifican si la base usa el formato compacto
+    - themes y openings se cargan al primer acceso (la página del puzzle no los usa)
+    - to_dict() para serializar (JSON, sesiones)
+    """
+
+    __slots__ = (
+        "puzzle_id",
+        "fen",
+        "moves",
+        "rating",
+        "orientation",
+        "side_to_move",
+        "plies",
+        "_theme_mask",
+        "_extra_ids",
+        "_themes",
+        "_openings",
+        "_db",
+    )
+
+    def __init__(self, db, puzzle_id, fen, moves, rating, theme_mask,
+                 orientation=None, side_to_move=None, plies=None, extra_ids=_UNLOADED):
+        # Formato compacto: BLOB en las mismas columnas
+        if isinstance(fen, bytes):
+            fen = unpack_fen(fen)
+
+        self.puzzle_id = puzzle_id
+        self.fen = fen
+        self.moves = unpack_moves(moves) if isinstance(moves, bytes) else moves.split()
+        self.rating = rating
+        # Bases antiguas sin columnas precalculadas: se derivan del FEN
+        self.orientation = orientation or LichessDB.get_board_orientation(fen)
+        self.side_to_move = side_to_move or fen.split()[1]
+        self.plies = plies or len(self.moves)
+        self._theme_mask = theme_mask
+        self._extra_ids = extra_ids
+        self._themes = None
+        self._openings = None
+        self._db = db
+
+    @property
+    def themes(self):
+        if self._themes is None:
+            if self._extra_ids is _UNLOADED:
+                self._extra_ids = self._db.get_extra_theme_ids(self.puzzle_id)
+            self._themes = self._db.decode_themes(self._theme_mask, self._extra_ids)
+        return self._themes
+
+    @property
+    def openings(self):
+        if self._openings is None:
+            self._openings = self._db.get_puzzle_openings(self.puzzle_id)
+        return self._openings
+
+    def to_dict(self, themes=True):
+        data = {
+            "puzzle_id": self.puzzle_id,
+            "fen": self.fen,
+            "moves": self.moves,
+            "rating": self.rating,
+            "orientation": self.orientation,
+            "side_to_move": self.side_to_move,
+            "plies": self.plies,
+        }
+        if themes:
+            data["themes"] = self.themes
+            data["openings"] = self.openings
+        return data
+
+    def __repr__(self):
+        return f"<Puzzle {self.puzzle_id} ({self.rating})>"
+
 
 class LichessDB:
     """
     Acceso a la base de datos de puzzles de Lichess (SQLite).
 
-    - Conexión persistente (optimizada para PythonAnywhere)
+    - Una conexión de solo lectura por hilo (sin contención entre workers)
+    - PRAGMAs de lectura configurables (settings.LICHESS_DB_PRAGMAS)
+    - Snapshots versionados: el manifest indica el archivo activo y el
+      cambio de versión se aplica al inicio de cada request
+    - Cache LRU de puzzles por id (por versión)
     - Random rápido con rnd precomputado
-    - Filtro por rating + theme(s)
+    - Themes como máscara de bits; nombres desde un mapa en memoria
+    - Filtro por rating + theme(s) o apertura(s) + longitud de la solución (plies)
     - Lookup directo por puzzle_id
     """
 
-    _conn = None  # conexión compartida
+    _local = threading.local()  # conexión y versión fijada por hilo
+    _lock = threading.Lock()
+    _buckets = {}  # (ruta, generación, theme) -> [(rating_from, rating_to, puzzles)]
+    _theme_maps = {}  # (ruta, generación, None) -> mapa de themes
+    _opening_maps = {}  # (ruta, generación, None) -> name -> id de aperturas
+    _cache = None  # LRUCache de puzzles por (ruta, generación, id)
+    _active_path = None  # snapshot activo
+    _signature = None  # identidad del manifest / archivo (inode, mtime, tamaño)
+    _generation = 0  # se incrementa en cada cambio de snapshot
+
+    # Puzzles mínimos en la franja antes de dejar de ampliarla
+    MIN_BAND_PUZZLES = 20
+
+    # Ids por consulta IN (por debajo del límite de variables de SQLite)
+    IN_CHUNK_SIZE = 500
+
+    # Ancho de franja de rating_buckets y de la columna bucket de las
+    # tablas de muestreo (RATING_BUCKET del importador)
+    RATING_BUCKET = 50
+
+    # Seeks por grupo UNION ALL en el muestreo
+    SAMPLE_GROUP_SIZE = 100
+
+    def __init__(self, db_path=None):
+        # Ruta explícita (scripts, benchmarks); None = snapshot activo
+        self.db_path = Path(db_path) if db_path else None
+
+    def _open(self, path):
+        """
+        Abre el archivo en modo URI de solo lectura
+        (immutable si LICHESS_DB_IMMUTABLE) y aplica los PRAGMAs.
+        """
+        uri = Path(path).resolve().as_uri() + "?mode=ro"
+        if getattr(settings, "LICHESS_DB_IMMUTABLE", False):
+            uri += "&immutable=1"
+
+        conn = sqlite3.connect(uri, uri=True)
+
+        pragmas = getattr(settings, "LICHESS_DB_PRAGMAS", {})
+        for name, value in pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+
+        return conn
+
+    # =====================================================
+    # Snapshots versionados
+    # =====================================================
+    @staticmethod
+    def _default_path():
+        return Path(getattr(
+            settings,
+            "LICHESS_DB_PATH",
+            Path(settings.BASE_DIR) / "lichess_puzzles.sqlite3",
+        ))
+
+    @staticmethod
+    def _manifest_path():
+        manifest = getattr(settings, "LICHESS_DB_MANIFEST", None)
+        return Path(manifest) if manifest else None
+
+    @classmethod
+    def refresh(cls):
+        """
+        Detecta un snapshot nuevo (manifest o inode del archivo).
+        Si cambió, apunta al archivo nuevo e invalida los caches.
+        """
+        manifest = cls._manifest_path()
+        watched = manifest if manifest and manifest.exists() else cls._default_path()
+
+        try:
+            st = os.stat(watched)
+            signature = (str(watched), st.st_ino, st.st_mtime_ns, st.st_size)
+        except OSError:
+            signature = None
+
+        if signature == cls._signature and cls._active_path is not None:
+            return
+
+        with cls._lock:
+            if signature == cls._signature and cls._active_path is not None:
+                return
+
+            path = cls._default_path()
+            if watched == manifest:
+                with open(manifest, encoding="utf-8") as f:
+                    path = manifest.parent / json.load(f)["file"]
+
+            if cls._active_path is not None:
+                cls.invalidate()
 
-    def __init__(self):
-        self.db_path = Path(settings.BASE_DIR) / "lichess_puzzles.sqlite3"
+            cls._active_path = path
+            cls._signature = signature
+
+    @classmethod
+    def begin_request(cls):
+        """
+        Frontera de request: fija en el hilo actual el snapshot
+        vigente, así una request nunca cambia de archivo a mitad.
+        """
+        cls.refresh()
+        cls._local.pinned = (cls._active_path, cls._generation)
+
+    @classmethod
+    def end_request(cls):
+        cls._local.pinned = None
+
+    def _resolve(self):
+        """
+        (ruta, generación) que usa este hilo.
+        """
+        cls = self.__class__
+
+        if self.db_path is not None:
+            return self.db_path, cls._generation
+
+        pinned = getattr(cls._local, "pinned", None)
+        if pinned is not None:
+            return pinned
+
+        # Fuera de una request (comandos, scripts)
+        cls.refresh()
+        return cls._active_path, cls._generation
 
     def connect(self):
         """
-        Devuelve una conexión SQLite persistente.
+        Devuelve la conexión SQLite del hilo actual.
         Solo lectura.
         """
-        if self.__class__._conn is None:
-            conn = sqlite3.connect(
-                self.db_path,
-                check_same_thread=False
-            )
+        local = self.__class__._local
+        path, generation = self._resolve()
+        key = (str(path), generation)
 
-            cursor = conn.cursor()
+        if getattr(local, "key", None) != key:
+            if getattr(local, "conn", None) is not None:
+                local.conn.close()
 
-            self.__class__._conn = conn
+            local.conn = self._open(path)
+            local.key = key
 
-        return self.__class__._conn
+        return local.conn
 
-    def get_board_orientation(self, fen):
+    # =====================================================
+    # Cache de puzzles
+    # =====================================================
+    @classmethod
+    def get_cache(cls):
+        if cls._cache is None:
+            cls._cache = LRUCache(
+                maxsize=getattr(settings, "LICHESS_CACHE_SIZE", 4096),
+                ttl=getattr(settings, "LICHESS_CACHE_TTL", None),
+            )
+        return cls._cache
+
+    @classmethod
+    def cache_stats(cls):
+        return cls.get_cache().stats()
+
+    @classmethod
+    def invalidate(cls):
+        """
+        Descarta caches y fuerza reabrir las conexiones de cada hilo.
+        """
+        cls.get_cache().clear()
+        cls._buckets = {}
+        cls._theme_maps = {}
+        cls._opening_maps = {}
+        cls._generation += 1
+
+    def _cache_key(self, key):
+        # (ruta, generación, clave): nunca se mezclan versiones
+        path, generation = self._resolve()
+        return (str(path), generation, key)
+
+    @staticmethod
+    def get_board_orientation(fen):
         try:
             return "white" if fen.split()[1] == "b" else "black"
         except Exception:
             return "white"
 
     # =====================================================
-    # Random óptimo por rating + theme(s)
+    # Themes: mapa en memoria y decodificación de la máscara
     # =====================================================
-    def get_random_puzzle(self, rating_min=0, rating_max=3000, themes=None):
-        themes = themes or []
+    def get_theme_map(self):
+        """
+        {"ids": name -> id, "names": id -> name, "bits": [(bit, name)]}
+        Se carga una vez por snapshot.
+        """
+        key = self._cache_key(None)
+        theme_map = self.__class__._theme_maps.get(key)
+        if theme_map is not None:
+            return theme_map
+
+        rows = self.connect().execute(
+            "SELECT id, name, bit FROM themes"
+        ).fetchall()
+
+        theme_map = {
+            "ids": {name: theme_id for theme_id, name, _ in rows},
+            "names": {theme_id: name for theme_id, name, _ in rows},
+            "bits": sorted((bit, name) for _, name, bit in rows if bit is not None),
+        }
+        self.__class__._theme_maps[key] = theme_map
+        return theme_map
 
-        conn = self.connect()
-        cursor = conn.cursor()
+    def decode_themes(self, mask, extra_ids=None):
+        """
+        Nombres de los themes de un puzzle: bits de la máscara
+        + ids sueltos de puzzle_themes (aperturas y sobrantes).
+        """
+        theme_map = self.get_theme_map()
+        names = [name for bit, name in theme_map["bits"] if mask >> bit & 1]
 
-        rnd = random.randint(0, 2**31 - 1)
+        if extra_ids:
+            names.extend(
+                theme_map["names"][int(theme_id)]
+                for theme_id in extra_ids.split(",")
+            )
+
+        return names
+
+    def get_extra_theme_ids(self, puzzle_id):
+        row = self.connect().execute("""
+            SELECT group_concat(theme_id)
+            FROM puzzle_themes
+            WHERE puzzle_id = ?
+        """, (puzzle_id,)).fetchone()
+        return row[0]
 
-        join = ""
-        where = [
-            "p.rating BETWEEN ? AND ?",
-            "p.rnd >= ?",
+    # =====================================================
+    # Aperturas (tablas propias, fuera de themes)
+    # =====================================================
+    def get_opening_map(self):
+        """
+        name -> id de las aperturas. Se carga una vez por snapshot.
+        """
+        key = self._cache_key(None)
+        opening_map = self.__class__._opening_maps.get(key)
+        if opening_map is not None:
+            return opening_map
+
+        opening_map = dict(
+            self.connect().execute("SELECT name, id FROM openings").fetchall()
+        )
+        self.__class__._opening_maps[key] = opening_map
+        return opening_map
+
+    def get_puzzle_openings(self, puzzle_id):
+        return [
+            name for (name,) in self.connect().execute("""
+                SELECT o.name
+                FROM puzzle_openings po
+                JOIN openings o ON o.id = po.opening_id
+                WHERE po.puzzle_id = ?
+                ORDER BY o.name
+            """, (puzzle_id,))
         ]
-        params = [rating_min, rating_max, rnd]
 
-        if themes:
-            join = """
-                JOIN puzzle_themes pt ON pt.puzzle_id = p.puzzle_id
-                JOIN themes t ON t.id = pt.theme_id
+    # Columnas de un puzzle (sin los ids de puzzle_themes)
+    PUZZLE_COLUMNS = """
+        p.puzzle_id, p.fen, p.moves, p.rating, p.theme_mask,
+        p.orientation, p.side_to_move, p.plies
+    """
+
+    # Con themes: la lista de ids de puzzle_themes va en la misma
+    # fila (subconsulta por PK), sin join a themes. Es la que usan
+    # las lecturas de puzzles que se sirven: themes sale entonces de
+    # la máscara y el mapa en memoria, sin otra consulta.
+    PUZZLE_COLUMNS_WITH_THEMES = PUZZLE_COLUMNS + """,
+        (
+            SELECT group_concat(pt.theme_id)
+            FROM puzzle_themes pt
+            WHERE pt.puzzle_id = p.puzzle_id
+        )
+    """
+
+    # =====================================================
+    # Random óptimo por rating + theme(s)
+    # =====================================================
+    def _sample_sql(self, keys, wrap, plies=None, openings=False):
+        """
+        SQL de muestreo sobre el índice cubriente de puzzle_samples
+        (u opening_samples si openings: los ids son de apertura).
+
+        keys: número de pares (id, franja) a muestrear. Se toma el
+        menor rnd de cada par (un seek por par, solo puzzles de esa
+        franja de rating) y luego el menor de todos.
+        plies (min, max) filtra por longitud de la solución; la
+        columna está en el índice, sin acceder a la fila.
+        Sin keys se muestrea sobre todos los puzzles.
+        """
+        rnd_filter = "s.rnd < ?" if wrap else "s.rnd >= ?"
+        if plies:
+            rnd_filter += " AND s.plies BETWEEN ? AND ?"
+
+        if not keys:
+            return f"""
+                SELECT s.puzzle_id
+                FROM puzzles s
+                WHERE {rnd_filter}
+                  AND s.rating BETWEEN ? AND ?
+                ORDER BY s.rnd
+                LIMIT 1
             """
-            where.append(
-                "t.name IN ({})".format(",".join("?" * len(themes)))
+
+        table, key = "puzzle_samples", "theme_id"
+        if openings:
+            table, key = "opening_samples", "opening_id"
+
+        per_key = """
+            SELECT * FROM (
+                SELECT s.puzzle_id, s.rnd
+                FROM {table} s
+                WHERE s.{key} = ?
+                  AND s.bucket = ?
+                  AND {rnd_filter}
+                  AND s.rating BETWEEN ? AND ?
+                ORDER BY s.rnd
+                LIMIT 1
             )
-            params.extend(themes)
+        """.format(table=table, key=key, rnd_filter=rnd_filter)
 
-        where_sql = " AND ".join(where)
+        # SQLite limita los términos de un UNION (500): por grupos
+        groups = [
+            "SELECT * FROM ({})".format(
+                " UNION ALL ".join([per_key] * min(self.SAMPLE_GROUP_SIZE, keys - i))
+            )
+            for i in range(0, keys, self.SAMPLE_GROUP_SIZE)
+        ]
 
-        # Query principal
-        cursor.execute(f"""
-            SELECT DISTINCT
-                p.puzzle_id,
-                p.fen,
-                p.moves,
-                p.rating
-            FROM puzzles p
-            {join}
-            WHERE {where_sql}
-            ORDER BY p.rnd
+        return """
+            SELECT puzzle_id FROM (
+                {}
+            )
+            ORDER BY rnd
             LIMIT 1
-        """, params)
+        """.format(" UNION ALL ".join(groups))
 
-        row = cursor.fetchone()
+    def _sample_params(self, keys, rnd, rating_min, rating_max, plies=None):
+        seek = [rnd, *(plies or ()), rating_min, rating_max]
+        if not keys:
+            return seek
 
-        # Wrap-around
-        if not row:
-            cursor.execute(f"""
-                SELECT DISTINCT
-                    p.puzzle_id,
-                    p.fen,
-                    p.moves,
-                    p.rating
-                FROM puzzles p
-                {join}
-                WHERE p.rating BETWEEN ? AND ?
-                ORDER BY p.rnd
-                LIMIT 1
-            """, [rating_min, rating_max] + themes)
+        params = []
+        for key_id, bucket in keys:
+            params.extend([key_id, bucket, *seek])
+        return params
 
-            row = cursor.fetchone()
+    def _sample_keys(self, ids, names, rating_min, rating_max, openings=False):
+        """
+        Pares (id, franja) con puzzles entre rating_min y rating_max:
+        solo las franjas no vacías (rating_buckets, en memoria). Las
+        aperturas no tienen conteo propio; se usan las de todos los
+        puzzles.
+        """
+        def buckets(name):
+            return [
+                rating_from // self.RATING_BUCKET
+                for rating_from, rating_to, _ in self.get_rating_buckets(name)
+                if rating_to >= rating_min and rating_from <= rating_max
+            ]
+
+        if openings:
+            return [(key_id, bucket) for key_id in ids for bucket in buckets(None)]
+
+        return [
+            (key_id, bucket)
+            for key_id, name in zip(ids, names)
+            for bucket in buckets(name)
+        ]
 
-        if not row:
+    def _plies_range(self, min_plies, max_plies):
+        if min_plies is None and max_plies is None:
             return None
+        return (min_plies or 0, max_plies if max_plies is not None else 2**31)
 
-        puzzle_id, fen, moves, rating = row
+    def get_random_puzzle(self, rating_min=0, rating_max=3000, themes=None,
+                          min_plies=None, max_plies=None, openings=None):
+        """
+        themes u openings (no ambos): puzzles de cualquiera de ellos.
+        """
+        if themes and openings:
+            raise ValueError("themes y openings no se pueden combinar")
 
-        # Obtener todos los themes del puzzle
-        cursor.execute("""
-            SELECT t.name
-            FROM themes t
-            JOIN puzzle_themes pt ON pt.theme_id = t.id
-            WHERE pt.puzzle_id = ?
-        """, (puzzle_id,))
+        conn = self.connect()
+        cursor = conn.cursor()
 
-        theme_list = [r[0] for r in cursor.fetchall()]
+        # Nombres -> (id, franja) (los desconocidos no tienen puzzles)
+        keys = None
+        if themes:
+            theme_ids = self.get_theme_map()["ids"]
+            names = [t for t in themes if t in theme_ids]
+            keys = self._sample_keys(
+                [theme_ids[t] for t in names], names, rating_min, rating_max
+            )
+        elif openings:
+            opening_ids = self.get_opening_map()
+            keys = self._sample_keys(
+                [opening_ids[o] for o in openings if o in opening_ids],
+                None, rating_min, rating_max, openings=True,
+            )
+        if keys == []:
+            return None
 
-        return {
-            "puzzle_id": puzzle_id,
-            "fen": fen,
-            "moves": moves.split(),
-            "rating": rating,
-            "orientation": self.get_board_orientation(fen),
-            "themes": theme_list,
-        }
+        by_opening = bool(openings)
+        count = len(keys or ())
+
+        plies = self._plies_range(min_plies, max_plies)
+        rnd = random.randint(0, 2**31 - 1)
+        params = self._sample_params(keys, rnd, rating_min, rating_max, plies)
+
+        # Primer puzzle con rnd >= aleatorio y, si no hay,
+        # wrap-around sobre el mismo índice (rnd < aleatorio).
+        # Todo en una sola consulta.
+        cursor.execute(f"""
+            SELECT {self.PUZZLE_COLUMNS_WITH_THEMES}
+            FROM puzzles p
+            WHERE p.puzzle_id = (
+                SELECT puzzle_id FROM ({self._sample_sql(count, False, plies, by_opening)})
+                UNION ALL
+                SELECT puzzle_id FROM ({self._sample_sql(count, True, plies, by_opening)})
+                LIMIT 1
+            )
+        """, params + params)
+
+        row = cursor.fetchone()
+        if not row:
+            return None
+
+        return self._build_puzzle(row)
+
+    # =====================================================
+    # Random por rating más cercano (franjas precalculadas)
+    # =====================================================
+    def get_rating_buckets(self, theme=None):
+        """
+        Conteo de puzzles por franja de rating de un tema
+        (None = todos los puzzles). Se cachea por proceso.
+        """
+        key = self._cache_key(theme)
+        buckets = self.__class__._buckets.get(key)
+        if buckets is not None:
+            return buckets
+
+        theme_id = 0
+        if theme is not None:
+            theme_id = self.get_theme_map()["ids"].get(theme)
+
+        buckets = []
+        if theme_id is not None:
+            buckets = sorted(self.connect().execute("""
+                SELECT rating_from, rating_to, puzzles
+                FROM rating_buckets
+                WHERE theme_id = ?
+            """, (theme_id,)).fetchall())
+
+        self.__class__._buckets[key] = buckets
+        return buckets
+
+    def get_rating_band(self, target, max_spread, themes=None):
+        """
+        Franja [min, max] más estrecha alrededor de target que
+        contiene al menos MIN_BAND_PUZZLES puzzles (o los que haya
+        dentro de max_spread). None si no hay ninguno.
+        """
+        counts = {}
+        for theme in themes or [None]:
+            for rating_from, rating_to, puzzles in self.get_rating_buckets(theme):
+                key = (rating_from, rating_to)
+                counts[key] = counts.get(key, 0) + puzzles
+
+        def distance(bucket):
+            rating_from, rating_to = bucket
+            if rating_from <= target <= rating_to:
+                return 0
+            return min(abs(rating_from - target), abs(rating_to - target))
+
+        band = None
+        total = 0
+
+        for bucket in sorted(counts, key=distance):
+            if distance(bucket) > max_spread:
+                break
+
+            rating_from, rating_to = bucket
+            if band is None:
+                band = [rating_from, rating_to]
+            else:
+                band = [min(band[0], rating_from), max(band[1], rating_to)]
+
+            total += counts[bucket]
+            if total >= self.MIN_BAND_PUZZLES:
+                break
+
+        return band
+
+    def get_nearest_puzzle(self, target, max_spread=300, themes=None,
+                           min_plies=None, max_plies=None, openings=None):
+        """
+        Puzzle aleatorio con el rating más cercano a target
+        (a lo sumo max_spread, redondeado a franjas completas),
+        con una sola consulta de muestreo.
+        Las franjas no distinguen longitud ni apertura (con openings
+        se usan las de todos los puzzles): con esos filtros puede no
+        haber puzzles en la franja (None).
+        """
+        band = self.get_rating_band(target, max_spread, themes)
+        if band is None:
+            return None
+
+        return self.get_random_puzzle(
+            rating_min=band[0],
+            rating_max=band[1],
+            themes=themes,
+            min_plies=min_plies,
+            max_plies=max_plies,
+            openings=openings,
+        )
 
     # =====================================================
     # Lookup directo por ID
     # =====================================================
     def get_puzzle_by_id(self, puzzle_id):
+        puzzle = self.get_cache().get(self._cache_key(puzzle_id))
+        if puzzle is not None:
+            return puzzle
+
         conn = self.connect()
         cursor = conn.cursor()
 
-        cursor.execute("""
-            SELECT puzzle_id, fen, moves, rating
-            FROM puzzles
-            WHERE puzzle_id = ?
+        cursor.execute(f"""
+            SELECT {self.PUZZLE_COLUMNS_WITH_THEMES}
+            FROM puzzles p
+            WHERE p.puzzle_id = ?
         """, (puzzle_id,))
 
         row = cursor.fetchone()
         if not row:
             return None
 
-        puzzle_id, fen, moves, rating = row
+        return self._build_puzzle(row)
 
-        cursor.execute("""
-            SELECT t.name
-            FROM themes t
-            JOIN puzzle_themes pt ON pt.theme_id = t.id
-            WHERE pt.puzzle_id = ?
-        """, (puzzle_id,))
-
-        theme_list = [r[0] for r in cursor.fetchall()]
-
-        return {
-            "puzzle_id": puzzle_id,
-            "fen": fen,
-            "moves": moves.split(),
-            "rating": rating,
-            "orientation": self.get_board_orientation(fen),
-            "themes": theme_list,
-        }
+    # =====================================================
+    # Lookup en lote
+    # =====================================================
+    def get_puzzles_by_ids(self, puzzle_ids):
+        """
+        Devuelve (puzzles, missing): los puzzles en el orden de
+        puzzle_ids y los ids que no existen. Una consulta por cada
+        IN_CHUNK_SIZE ids no cacheados (themes incluidos).
+        Lee la cache pero no la llena, para no desplazar los
+        puzzles en uso con lotes grandes.
+        """
+        cache = self.get_cache()
+        found = {}
+        pending = []
+
+        for puzzle_id in dict.fromkeys(puzzle_ids):
+            puzzle = cache.get(self._cache_key(puzzle_id))
+            if puzzle is not None:
+                found[puzzle_id] = puzzle
+            else:
+                pending.append(puzzle_id)
+
+        if pending:
+            cursor = self.connect().cursor()
+
+            for i in range(0, len(pending), self.IN_CHUNK_SIZE):
+                chunk = pending[i:i + self.IN_CHUNK_SIZE]
+                cursor.execute(f"""
+                    SELECT {self.PUZZLE_COLUMNS_WITH_THEMES}
+                    FROM puzzles p
+                    WHERE p.puzzle_id IN ({",".join("?" * len(chunk))})
+                """, chunk)
+
+                for row in cursor.fetchall():
+                    puzzle = self._build_puzzle(row, cache=False)
+                    found[puzzle.puzzle_id] = puzzle
+
+        puzzles = [found[pid] for pid in puzzle_ids if pid in found]
+        missing = [pid for pid in dict.fromkeys(puzzle_ids) if pid not in found]
+
+        return puzzles, missing
+
+    def _build_puzzle(self, row, cache=True):
+        puzzle = Puzzle(self, *row)
+
+        if cache:
+            self.get_cache().set(self._cache_key(puzzle.puzzle_id), puzzle)
+        return puzzle
@@ -0,0 +1,117 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import RetryPuzzle
+
+
+MIN_EASE = 1.3
+EASE_PENALTY = 0.2
+
+
+def retry_settings():
+    return (
+        timedelta(days=getattr(settings, "RETRY_FIRST_INTERVAL", 1)),
+        timedelta(days=getattr(settings, "RETRY_GRADUATION_INTERVAL", 30)),
+        getattr(settings, "RETRY_MAX_PER_USER", 200),
+    )
+
+
+def record_failure(user, puzzle_id):
+    """
+    Fallo: el retry vuelve al primer intervalo y baja su ease.
+    Si no existía se crea (y se recorta la lista del usuario).
+    """
+    first, _, max_per_user = retry_settings()
+    now = timezone.now()
+
+    # Un solo UPDATE; fail_count se incrementa en la base
+    updated = RetryPuzzle.objects.filter(
+        user=user,
+        puzzle_id=puzzle_id,
+    ).update(
+        fail_count=F("fail_count") + 1,
+        interval=first,
+        ease=Greatest(F("ease") - EASE_PENALTY, Value(MIN_EASE)),
+        due_at=now + first,
+        last_attempt_at=now,
+    )
+    if updated:
+        return
+
+    RetryPuzzle.objects.create(
+        user=user,
+        puzzle_id=puzzle_id,
+        fail_count=1,
+        interval=first,
+        due_at=now + first,
+    )
+
+    # Sin crecer sin límite: fuera los que más tardan en tocar
+    overflow = list(
+        RetryPuzzle.objects
+        .filter(user=user)
+        .order_by("due_at")
+        .values_list("pk", flat=True)[max_per_user:]
+    )
+    if overflow:
+        RetryPuzzle.objects.filter(pk__in=overflow).delete()
+
+
+def record_success(user, puzzle_id):
+    """
+    Acierto: el intervalo crece por ease; al pasar
+    RETRY_GRADUATION_INTERVAL el retry se da por aprendido.
+    """
+    _, graduation, _ = retry_settings()
+
+    retry = (
+        RetryPuzzle.objects
+        .filter(user=user, puzzle_id=puzzle_id)
+        .first()
+    )
+    if retry is None:
+        return
+
+    interval = retry.interval * retry.ease
+    if interval > graduation:
+        retry.delete()
+        return
+
+    retry.interval = interval
+    retry.due_at = timezone.now() + interval
+    retry.save(update_fields=["interval", "due_at", "last_attempt_at"])
+
+
+def due_retries(user, limit, exclude=()):
+    """
+    puzzle_ids de los retries vencidos, el más atrasado primero
+    (un recorrido del índice (user, due_at)).
+    """
+    return [
+        puzzle_id
+        for puzzle_id in (
+            RetryPuzzle.objects
+            .filter(user=user, due_at__lte=timezone.now())
+            .order_by("due_at")
+            .values_list("puzzle_id", flat=True)[:limit + len(exclude)]
+        )
+        if puzzle_id not in exclude
+    ][:limit]
+
+
+def due_counts(user_ids, now=None):
+    """
+    user_id -> retries vencidos, para varios usuarios en una query.
+    Los usuarios sin retries vencidos no aparecen.
+    """
+    return dict(
+        RetryPuzzle.objects
+        .filter(user_id__in=user_ids, due_at__lte=now or timezone.now())
+        .values("user_id")
+        .annotate(due=Count("pk"))
+        .values_list("user_id", "due")
+    )
@@ -1,7 +1,7 @@
 # chess/signals.py
 
 from django.db import transaction
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 
@@ -13,6 +13,9 @@ from .models import (
     TrainingCycleTheme,
     Elo,
 )
+from .cycle_cache import invalidate_cycle
+from .theme_tree import invalidate_theme_tree
+from .overview_cache import invalidate_all_overviews, invalidate_overview
 
 User = get_user_model()
 
@@ -109,3 +112,59 @@ def assign_cycle_themes(sender, instance, created, **kwargs):
         )
 
     TrainingCycleTheme.objects.bulk_create(objs)
+
+
+# =====================================================
+# Cache del ciclo semanal (cycle_cache)
+# =====================================================
+@receiver(post_save, sender=TrainingCycle)
+def refresh_cycle_cache(sender, instance, created, **kwargs):
+    # Los temas se asignan en assign_cycle_themes (bulk_create, sin
+    # signals). La fila del ciclo no se cachea: el resto de saves
+    # (completed_puzzles) no tocan la cache
+    if created:
+        invalidate_cycle(instance.user_id, instance.start_date)
+
+
+@receiver(post_delete, sender=TrainingCycle)
+def drop_cycle_cache(sender, instance, **kwargs):
+    invalidate_cycle(instance.user_id, instance.start_date)
+
+
+@receiver(post_save, sender=TrainingCycleTheme)
+@receiver(post_delete, sender=TrainingCycleTheme)
+def drop_cycle_cache_on_theme_change(sender, instance, **kwargs):
+    cycle = (
+        TrainingCycle.objects
+        .filter(pk=instance.cycle_id)
+        .values_list("user_id", "start_date")
+        .first()
+    )
+    if cycle:
+        invalidate_cycle(*cycle)
+
+
+# =====================================================
+# Snapshot de la jerarquía de Theme (theme_tree)
+# =====================================================
+@receiver(post_save, sender=Theme)
+@receiver(post_delete, sender=Theme)
+def rebuild_theme_tree(sender, instance, **kwargs):
+    # Tras el commit: el snapshot nuevo se lee con los datos ya visibles
+    transaction.on_commit(invalidate_theme_tree)
+
+
+# =====================================================
+# Fragmento cacheado de theme_overview (overview_cache)
+# =====================================================
+@receiver(post_save, sender=ThemeElo)
+@receiver(post_delete, sender=ThemeElo)
+@receiver(post_save, sender=Elo)
+def drop_theme_overview(sender, instance, **kwargs):
+    invalidate_overview(instance.user_id)
+
+
+@receiver(post_save, sender=Theme)
+@receiver(post_delete, sender=Theme)
+def drop_all_theme_overviews(sender, instance, **kwargs):
+    invalidate_all_overviews()
@@ -1,3 +1,654 @@
-from django.test import TestCase
+import contextlib
+import csv
+import io
+import json
+import sqlite3
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+import import_lichess_puzzles as importer
+
+from .cycle_cache import cycle_cache_key, get_current_cycle
+from .encoding import pack_fen, pack_moves, unpack_fen, unpack_moves
+from .models import (
+    ActiveExercise,
+    PuzzleAttempt,
+    QueuedPuzzle,
+    RetryPuzzle,
+    Theme,
+    ThemeElo,
+    TrainingCycle,
+    TrainingCycleTheme,
+)
+from .puzzle_queue import fill_queue, pop_puzzle, refill_queue
+from .repository import LichessDB
+from .retries import (
+    EASE_PENALTY,
+    MIN_EASE,
+    due_counts,
+    due_retries,
+    record_failure,
+    record_success,
+)
+from .theme_tree import get_theme_tree, invalidate_theme_tree
+
+
+# =====================================================
+# Codificación compacta de FEN y jugadas
+# =====================================================
+class EncodingTests(SimpleTestCase):
+
+    def assertRoundTrip(self, fen):
+        self.assertEqual(unpack_fen(pack_fen(fen)), fen)
+
+    def test_initial_position(self):
+        self.assertRoundTrip(
+            "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+        )
+
+    def test_castling_rights(self):
+        for castling in ("KQkq", "Kq", "Qk", "k", "-"):
+            with self.subTest(castling=castling):
+                self.assertRoundTrip(
+                    f"r3k2r/8/8/8/8/8/8/R3K2R w {castling} - 4 20"
+                )
+
+    def test_en_passant_white_to_move(self):
+        # Negras acaban de jugar d7d5: la casilla queda en la fila 6
+        self.assertRoundTrip(
+            "rnbqkbnr/ppp1pppp/8/3pP3/8/8/PPPP1PPP/RNBQKBNR w KQkq d6 0 3"
+        )
+
+    def test_en_passant_black_to_move(self):
+        # Blancas acaban de jugar a2a4: la casilla queda en la fila 3
+        self.assertRoundTrip(
+            "rnbqkbnr/pppp1ppp/8/8/Pp6/8/1PPPPPPP/RNBQKBNR b KQkq a3 0 3"
+        )
+
+    def test_en_passant_h_file(self):
+        self.assertRoundTrip("4k3/8/8/6Pp/8/8/8/4K3 w - h6 0 40")
+
+    def test_odd_piece_count(self):
+        self.assertRoundTrip("8/8/8/8/8/8/8/K6k w - - 0 1")
+        self.assertRoundTrip("8/8/8/8/8/8/8/K5qk b - - 99 120")
+
+    def test_invalid_fen(self):
+        for fen in (
+            "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq -",
+            "rnbqkbnr/ppppxppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+            "8/8/8/8/8/8/8/K6k w - - 0 70000",
+            "8/8/8/8/8/8/8/K6k w X - 0 1",
+        ):
+            with self.subTest(fen=fen):
+                with self.assertRaises(ValueError):
+                    pack_fen(fen)
+
+    def test_non_canonical_fen(self):
+        for fen in (
+            # Enroques fuera de orden KQkq
+            "r3k2r/8/8/8/8/8/8/R3K2R w kqKQ - 0 1",
+            # Casilla de al paso en la fila del bando que mueve
+            "4k3/8/8/6Pp/8/8/8/4K3 w - h3 0 40",
+            # Huecos partidos ("44" en lugar de "8")
+            "44/8/8/8/8/8/8/K6k w - - 0 1",
+        ):
+            with self.subTest(fen=fen):
+                with self.assertRaises(ValueError):
+                    pack_fen(fen)
+
+    def test_moves_round_trip(self):
+        moves = "e1g1 e8c8 e5d6 a7a8q b2b1n g7h8r c2c1b h1a8"
+        self.assertEqual(unpack_moves(pack_moves(moves)), moves.split())
+
+    def test_empty_moves(self):
+        self.assertEqual(unpack_moves(pack_moves("")), [])
+
+    def test_invalid_moves(self):
+        for moves in ("e2e4 e7e9", "a7a8k", "e2e4x", "e2"):
+            with self.subTest(moves=moves):
+                with self.assertRaises(ValueError):
+                    pack_moves(moves)
+
+
+class ParseRowTests(SimpleTestCase):
+
+    def row(self, **fields):
+        return {
+            "PuzzleId": "00001",
+            "FEN": "r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1",
+            "Moves": "e1g1 e8c8",
+            "Rating": "1500",
+            "RatingDeviation": "70",
+            "Themes": "short endgame",
+            "OpeningTags": "",
+            **fields,
+        }
+
+    def test_compact_encodes(self):
+        row = self.row()
+        _, fen, moves, *_ = importer.parse_row(row, compact=True)
+
+        self.assertIsInstance(fen, bytes)
+        self.assertEqual(unpack_fen(fen), row["FEN"])
+        self.assertEqual(unpack_moves(moves), row["Moves"].split())
+
+    def test_compact_falls_back_to_text(self):
+        row = self.row(FEN="r3k2r/8/8/8/8/8/8/R3K2R w qkQK - 0 1")
+        _, fen, moves, *_ = importer.parse_row(row, compact=True)
+
+        self.assertEqual((fen, moves), (row["FEN"], row["Moves"]))
+
+    def test_fingerprint_ignores_encoding(self):
+        row = self.row()
+        self.assertEqual(
+            importer.parse_row(row)[-1],
+            importer.parse_row(row, compact=True)[-1],
+        )
+
+
+# =====================================================
+# Importador: delta sobre un dump viejo == bulk del nuevo
+# =====================================================
+CSV_HEADER = [
+    "PuzzleId", "FEN", "Moves", "Rating", "RatingDeviation",
+    "Popularity", "NbPlays", "Themes", "GameUrl", "OpeningTags",
+]
+
+FENS = [
+    "r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1",
+    "rnbqkbnr/ppp1pppp/8/3pP3/8/8/PPPP1PPP/RNBQKBNR w KQkq d6 0 3",
+    "4k3/1P6/8/8/8/8/8/4K3 w - - 0 50",
+]
+MOVES = ["e1g1 e8c8", "e5d6 e7d6 d1d6", "b7b8q e8d7"]
+THEMES = ["fork", "pin", "mateIn1", "endgame", "short", "long"]
+OPENINGS = ["", "Sicilian_Defense", "French_Defense French_Defense_Other"]
+
+
+def puzzle_rows(count, version=0):
+    """
+    Filas sintéticas deterministas. Con version > 0 se borran
+    unos puzzles, cambian otros y aparecen nuevos (y un tema nuevo).
+    """
+    rows = []
+    for i in range(count + 10 * version):
+        if version and i % 7 == 0:
+            continue
+
+        themes = {THEMES[i % 6], THEMES[(i * 5 + 1) % 6]}
+        rating = 800 + (i * 37) % 1600
+        if version and i % 5 == 0:
+            rating += 25
+            themes.add("zugzwang")
+
+        rows.append([
+            f"p{i:05d}", FENS[i % 3], MOVES[i % 3], rating, 70, 90, 100,
+            " ".join(sorted(themes)), "https://lichess.org/x", OPENINGS[i % 3],
+        ])
+    return rows
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        writer.writerows(rows)
+
+
+def dump_database(path):
+    """
+    Contenido comparable entre dos bases (por nombre, no por id;
+    rnd se sortea en cada import).
+    """
+    conn = sqlite3.connect(path)
+    try:
+        return [
+            sorted(conn.execute(sql))
+            for sql in (
+                "SELECT puzzle_id, fen, moves, rating, side_to_move, plies, "
+                "fingerprint FROM puzzles",
+                """
+                SELECT p.puzzle_id, t.name
+                FROM puzzles p
+                JOIN themes t
+                  ON t.bit IS NOT NULL AND (p.theme_mask >> t.bit) & 1
+                UNION ALL
+                SELECT pt.puzzle_id, t.name
+                FROM puzzle_themes pt JOIN themes t ON t.id = pt.theme_id
+                """,
+                "SELECT po.puzzle_id, o.name FROM puzzle_openings po "
+                "JOIN openings o ON o.id = po.opening_id",
+                "SELECT t.name, s.bucket, s.puzzle_id, s.rating, s.plies "
+                "FROM puzzle_samples s JOIN themes t ON t.id = s.theme_id",
+                "SELECT o.name, s.bucket, s.puzzle_id, s.rating, s.plies "
+                "FROM opening_samples s JOIN openings o ON o.id = s.opening_id",
+                "SELECT coalesce(t.name, ''), b.rating_from, b.puzzles "
+                "FROM rating_buckets b LEFT JOIN themes t ON t.id = b.theme_id",
+            )
+        ]
+    finally:
+        conn.close()
+
+
+class DeltaImportTests(SimpleTestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+
+        self.old_csv = self.dir / "old.csv"
+        self.new_csv = self.dir / "new.csv"
+        write_csv(self.old_csv, puzzle_rows(200))
+        write_csv(self.new_csv, puzzle_rows(200, version=1))
+
+    def run_quietly(self, func, *args, **kwargs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return func(*args, **kwargs)
+
+    def test_delta_matches_bulk(self):
+        for compact in (False, True):
+            with self.subTest(compact=compact):
+                bulk = self.dir / f"bulk-{compact}.sqlite3"
+                delta = self.dir / f"delta-{compact}.sqlite3"
+
+                self.run_quietly(
+                    importer.bulk_convert_csv_to_sqlite,
+                    self.new_csv, bulk, compact=compact,
+                )
+                self.run_quietly(
+                    importer.bulk_convert_csv_to_sqlite,
+                    self.old_csv, delta, compact=compact,
+                )
+                self.run_quietly(
+                    importer.delta_convert_csv_to_sqlite,
+                    self.new_csv, delta, compact=compact,
+                )
+
+                self.assertEqual(dump_database(delta), dump_database(bulk))
+
+    def test_delta_keeps_rnd_of_unchanged_puzzles(self):
+        path = self.dir / "delta.sqlite3"
+        self.run_quietly(importer.bulk_convert_csv_to_sqlite, self.old_csv, path)
+
+        def rnds():
+            conn = sqlite3.connect(path)
+            try:
+                return dict(conn.execute("SELECT puzzle_id, rnd FROM puzzles"))
+            finally:
+                conn.close()
+
+        before = rnds()
+        self.run_quietly(importer.delta_convert_csv_to_sqlite, self.new_csv, path)
+        after = rnds()
+
+        unchanged = [
+            f"p{i:05d}" for i in range(200) if i % 7 and i % 5
+        ]
+        self.assertEqual(
+            [after[p] for p in unchanged],
+            [before[p] for p in unchanged],
+        )
+
+    def test_failed_bulk_keeps_previous_database(self):
+        path = self.dir / "live.sqlite3"
+        self.run_quietly(importer.bulk_convert_csv_to_sqlite, self.old_csv, path)
+        before = dump_database(path)
+
+        with mock.patch.object(
+            importer, "create_indexes", side_effect=RuntimeError
+        ):
+            with self.assertRaises(RuntimeError):
+                self.run_quietly(
+                    importer.bulk_convert_csv_to_sqlite, self.new_csv, path
+                )
+
+        self.assertEqual(dump_database(path), before)
+        self.assertFalse(path.with_name(f"{path.name}.building").exists())
+
+
+class SnapshotTests(SimpleTestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.db = Path(tmp.name) / "puzzles.sqlite3"
+
+        csv_path = Path(tmp.name) / "puzzles.csv"
+        write_csv(csv_path, puzzle_rows(20))
+        with contextlib.redirect_stdout(io.StringIO()):
+            importer.bulk_convert_csv_to_sqlite(csv_path, self.db)
+
+    def publish(self, snapshot):
+        with contextlib.redirect_stdout(io.StringIO()):
+            importer.publish_snapshot(self.db, snapshot)
+
+    def test_same_second_gets_a_new_name(self):
+        # Dos imports en el mismo instante: el segundo no pisa el activo
+        with mock.patch.object(importer.time, "time", return_value=1e9):
+            first = importer.new_snapshot(self.db, copy_current=True)
+            self.publish(first)
+            second = importer.new_snapshot(self.db, copy_current=True)
+
+        self.assertNotEqual(first, second)
+        self.assertEqual(importer.current_snapshot(self.db), first)
+        self.assertEqual(dump_database(second), dump_database(first))
+
+
+# =====================================================
+# Retries con repetición espaciada
+# =====================================================
+@override_settings(
+    RETRY_FIRST_INTERVAL=1,
+    RETRY_GRADUATION_INTERVAL=30,
+    RETRY_MAX_PER_USER=200,
+)
+class RetryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create_user("retry", password="x")
+        cls.other = User.objects.create_user("other", password="x")
+
+    def retry(self, puzzle_id="p1"):
+        return RetryPuzzle.objects.get(user=self.user, puzzle_id=puzzle_id)
+
+    def test_first_failure_creates_retry(self):
+        record_failure(self.user, "p1")
+
+        retry = self.retry()
+        self.assertEqual(retry.fail_count, 1)
+        self.assertEqual(retry.interval, timedelta(days=1))
+        self.assertAlmostEqual(
+            retry.due_at, timezone.now() + timedelta(days=1),
+            delta=timedelta(minutes=1),
+        )
+
+    def test_repeated_failure_resets_interval_and_lowers_ease(self):
+        record_failure(self.user, "p1")
+        RetryPuzzle.objects.filter(pk=self.retry().pk).update(
+            interval=timedelta(days=6)
+        )
+
+        record_failure(self.user, "p1")
+
+        retry = self.retry()
+        self.assertEqual(retry.fail_count, 2)
+        self.assertEqual(retry.interval, timedelta(days=1))
+        self.assertAlmostEqual(retry.ease, 2.5 - EASE_PENALTY)
+
+    def test_ease_has_a_floor(self):
+        for _ in range(20):
+            record_failure(self.user, "p1")
+
+        self.assertAlmostEqual(self.retry().ease, MIN_EASE)
+
+    def test_success_grows_interval(self):
+        record_failure(self.user, "p1")
+        record_success(self.user, "p1")
+
+        retry = self.retry()
+        self.assertEqual(retry.interval, timedelta(days=2.5))
+        self.assertAlmostEqual(
+            retry.due_at, timezone.now() + timedelta(days=2.5),
+            delta=timedelta(minutes=1),
+        )
+
+    def test_success_past_graduation_deletes_retry(self):
+        record_failure(self.user, "p1")
+        for _ in range(3):
+            record_success(self.user, "p1")
+        # 1 -> 2.5 -> 6.25 -> 15.6 días
+        self.assertTrue(RetryPuzzle.objects.filter(user=self.user).exists())
+
+        record_success(self.user, "p1")
+        self.assertFalse(RetryPuzzle.objects.filter(user=self.user).exists())
+
+    def test_success_without_retry_is_noop(self):
+        record_success(self.user, "p1")
+        self.assertFalse(RetryPuzzle.objects.exists())
+
+    @override_settings(RETRY_MAX_PER_USER=3)
+    def test_failures_are_capped_per_user(self):
+        for i in range(5):
+            record_failure(self.user, f"p{i}")
+        record_failure(self.other, "p0")
+
+        self.assertEqual(
+            RetryPuzzle.objects.filter(user=self.user).count(), 3
+        )
+        self.assertEqual(
+            RetryPuzzle.objects.filter(user=self.other).count(), 1
+        )
+
+    def test_due_retries_oldest_first(self):
+        now = timezone.now()
+        for puzzle_id, days in (("late", -3), ("later", -5), ("future", 2), ("due", -1)):
+            RetryPuzzle.objects.create(
+                user=self.user, puzzle_id=puzzle_id,
+                due_at=now + timedelta(days=days),
+            )
+        RetryPuzzle.objects.create(
+            user=self.other, puzzle_id="other", due_at=now - timedelta(days=9)
+        )
+
+        self.assertEqual(
+            due_retries(self.user, 10), ["later", "late", "due"]
+        )
+        self.assertEqual(due_retries(self.user, 2), ["later", "late"])
+        self.assertEqual(
+            due_retries(self.user, 2, exclude={"later"}), ["late", "due"]
+        )
+
+    def test_due_counts(self):
+        now = timezone.now()
+        for user, days in ((self.user, -1), (self.user, -2), (self.user, 1), (self.other, 1)):
+            RetryPuzzle.objects.create(
+                user=user, puzzle_id=f"p{days}", due_at=now + timedelta(days=days)
+            )
+
+        self.assertEqual(
+            due_counts([self.user.pk, self.other.pk]), {self.user.pk: 2}
+        )
+
+
+# =====================================================
+# Cola de puzzles, submit_and_next y cache del ciclo
+# =====================================================
+LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TrainingTestCase(TestCase):
+    """
+    Base de Lichess sintética (la de puzzle_rows) y un usuario con
+    ThemeElo para los temas entrenables.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        tmp = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(tmp.cleanup)
+
+        csv_path = Path(tmp.name) / "puzzles.csv"
+        db_path = Path(tmp.name) / "puzzles.sqlite3"
+        write_csv(csv_path, puzzle_rows(200))
+        with contextlib.redirect_stdout(io.StringIO()):
+            importer.bulk_convert_csv_to_sqlite(csv_path, db_path)
+
+        cls.enterClassContext(override_settings(
+            LICHESS_DB_PATH=db_path,
+            LICHESS_DB_MANIFEST=None,
+        ))
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Theme.objects.create(name="Táctica", is_trainable=False)
+        for name in ("fork", "pin", "endgame", "mateIn1"):
+            Theme.objects.create(name=name.title(), lichess_name=name, parent=category)
+
+        cls.user = get_user_model().objects.create_user("player", password="x")
+
+    def setUp(self):
+        cache.clear()
+        # Las signals de Theme invalidan el árbol on_commit (no corre en TestCase)
+        invalidate_theme_tree()
+        self.db = LichessDB()
+
+
+class PopPuzzleTests(TrainingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        _, self.cycle_themes = get_current_cycle(self.user)
+        self.theme = self.cycle_themes[0].theme
+        self.elo = ThemeElo.objects.get(user=self.user, theme=self.theme).elo
+
+    def queue(self, *entries):
+        QueuedPuzzle.objects.bulk_create(
+            QueuedPuzzle(user=self.user, position=position, **entry)
+            for position, entry in enumerate(entries, start=1)
+        )
+
+    def test_drops_drifted_and_missing_entries(self):
+        self.queue(
+            {"puzzle_id": "p00001", "theme": self.theme, "target_elo": self.elo - 200},
+            {"puzzle_id": "gone"},
+            {"puzzle_id": "p00002", "theme": self.theme, "target_elo": self.elo + 50},
+            {"puzzle_id": "p00003", "theme": self.theme, "target_elo": self.elo},
+        )
+
+        puzzle = pop_puzzle(self.user, self.cycle_themes, self.db)
+
+        self.assertEqual(puzzle.puzzle_id, "p00002")
+        self.assertEqual(
+            list(QueuedPuzzle.objects.values_list("puzzle_id", flat=True)),
+            ["p00003"],
+        )
+
+    @override_settings(PUZZLE_QUEUE_ELO_DRIFT=300)
+    def test_drift_threshold_is_configurable(self):
+        self.queue(
+            {"puzzle_id": "p00001", "theme": self.theme, "target_elo": self.elo - 200},
+        )
+
+        puzzle = pop_puzzle(self.user, self.cycle_themes, self.db)
+
+        self.assertEqual(puzzle.puzzle_id, "p00001")
+
+    def test_empty_queue_adds_a_single_puzzle(self):
+        with mock.patch(
+            "chess.puzzle_queue.fill_queue", wraps=fill_queue
+        ) as fill:
+            puzzle = pop_puzzle(self.user, self.cycle_themes, self.db)
+
+        self.assertIsNotNone(puzzle)
+        self.assertEqual(fill.call_args.kwargs["limit"], 1)
+        self.assertFalse(QueuedPuzzle.objects.exists())
+
+    def test_refill_queue_is_bounded(self):
+        added = refill_queue(self.user, self.cycle_themes, self.db)
+
+        self.assertLessEqual(added, 2)
+        self.assertEqual(QueuedPuzzle.objects.count(), added)
+
+
+class SubmitAndNextTests(TrainingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get("/puzzle/").status_code, 200)
+        self.active = ActiveExercise.objects.get(user=self.user)
+
+    def submit(self, puzzle_id, solved=True):
+        return self.client.post(
+            "/puzzle/next/",
+            json.dumps({"puzzle_id": puzzle_id, "solved": solved}),
+            content_type="application/json",
+        )
+
+    def test_serves_next_puzzle_in_the_same_row(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.submit(self.active.puzzle_id)
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["status"], "ok")
+        self.assertEqual(data["cycle"]["completed_puzzles"], 1)
+
+        nxt = data["next"]
+        puzzle = self.db.get_puzzle_by_id(nxt["puzzle_id"])
+        active = ActiveExercise.objects.get(user=self.user)
+
+        self.assertEqual(active.pk, self.active.pk)
+        self.assertEqual(active.puzzle_id, nxt["puzzle_id"])
+        self.assertEqual(active.puzzle_rating, puzzle.rating)
+        self.assertTrue(active.theme_ids)
+        self.assertEqual(
+            sorted(active.theme_ids),
+            sorted(get_theme_tree().ids_for_lichess_names(puzzle.themes)),
+        )
+        self.assertTrue(
+            PuzzleAttempt.objects.filter(
+                user=self.user, puzzle_id=self.active.puzzle_id, solved=True
+            ).exists()
+        )
+
+    def test_refills_queue_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.submit(self.active.puzzle_id)
+        queued = QueuedPuzzle.objects.count()
+
+        for callback in callbacks:
+            callback()
+
+        self.assertGreater(QueuedPuzzle.objects.count(), queued)
+
+    def test_rejects_stale_puzzle_id(self):
+        response = self.submit("not-the-active-one")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            ActiveExercise.objects.get(user=self.user).puzzle_id,
+            self.active.puzzle_id,
+        )
+        self.assertFalse(PuzzleAttempt.objects.exists())
+
+
+class CycleCacheTests(TrainingTestCase):
+
+    def test_new_cycle_theme_clears_cache_after_commit(self):
+        cycle, cycle_themes = get_current_cycle(self.user)
+        key = cycle_cache_key(self.user.pk, cycle.start_date)
+        self.assertIsNotNone(cache.get(key))
+
+        used = {ct.theme_id for ct in cycle_themes}
+        theme = Theme.objects.filter(lichess_name__isnull=False).exclude(pk__in=used).first()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TrainingCycleTheme.objects.create(cycle=cycle, theme=theme, priority=3)
+            # Hasta el commit la cache sigue intacta
+            self.assertIsNotNone(cache.get(key))
+
+        self.assertIsNone(cache.get(key))
+        _, cycle_themes = get_current_cycle(self.user)
+        self.assertIn(theme.pk, {ct.theme_id for ct in cycle_themes})
+
+    def test_cached_cycle_reads_progress_from_the_database(self):
+        cycle, _ = get_current_cycle(self.user)
+        TrainingCycle.objects.filter(pk=cycle.pk).update(completed_puzzles=7)
+
+        cached, _ = get_current_cycle(self.user)
+
+        self.assertEqual(cached.completed_puzzles, 7)
@@ -0,0 +1,106 @@
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+from django.conf import settings
+
+from .models import Theme
+
+
+ThemeNode = namedtuple(
+    "ThemeNode",
+    ["id", "name", "lichess_name", "parent_id", "is_trainable", "description"],
+)
+
+
+class ThemeTree:
+    """
+    Snapshot inmutable de la jerarquía de Theme (categoría → tema).
+
+    - by_id: id -> ThemeNode
+    - by_lichess_name: lichess_name -> ThemeNode
+    - children: id de categoría -> tupla de ThemeNode (por nombre)
+    - categories: categorías raíz (por nombre)
+    """
+
+    __slots__ = ("by_id", "by_lichess_name", "children", "categories")
+
+    def __init__(self, nodes):
+        nodes = sorted(nodes, key=lambda node: node.name)
+
+        children = {}
+        for node in nodes:
+            if node.parent_id is not None:
+                children.setdefault(node.parent_id, []).append(node)
+
+        self.by_id = MappingProxyType({node.id: node for node in nodes})
+        self.by_lichess_name = MappingProxyType({
+            node.lichess_name: node
+            for node in nodes
+            if node.lichess_name
+        })
+        self.children = MappingProxyType({
+            parent_id: tuple(subthemes)
+            for parent_id, subthemes in children.items()
+        })
+        self.categories = tuple(node for node in nodes if node.parent_id is None)
+
+    def ids_for_lichess_names(self, names):
+        """
+        ids de los Theme con esos nombres de Lichess (los demás se ignoran).
+        """
+        return [
+            self.by_lichess_name[name].id
+            for name in names
+            if name in self.by_lichess_name
+        ]
+
+
+_lock = threading.Lock()
+_snapshot = None  # (ThemeTree, momento de construcción)
+_generation = 0  # se incrementa en cada invalidación
+
+
+def get_theme_tree():
+    """
+    ThemeTree del proceso. Se reconstruye al cambiar un Theme
+    (signals) y, como red de seguridad para los cambios hechos
+    desde otros procesos, cada THEME_TREE_TTL segundos.
+    """
+    global _snapshot
+
+    ttl = getattr(settings, "THEME_TREE_TTL", 300)
+    snapshot = _snapshot
+    if snapshot is not None and (ttl is None or time.monotonic() - snapshot[1] < ttl):
+        return snapshot[0]
+
+    with _lock:
+        generation = _generation
+        tree = ThemeTree(
+            ThemeNode(*row)
+            for row in Theme.objects.values_list(*ThemeNode._fields)
+        )
+        # Una invalidación durante la lectura deja el snapshot sin guardar
+        if generation == _generation:
+            _snapshot = (tree, time.monotonic())
+    return tree
+
+
+def invalidate_theme_tree():
+    global _snapshot, _generation
+    _generation += 1
+    _snapshot = None
+
+
+def get_theme_node(theme_id):
+    """
+    ThemeNode de theme_id. Si el snapshot es anterior al tema (creado
+    desde otro proceso, antes del TTL) se reconstruye una vez.
+    None si el tema no existe.
+    """
+    node = get_theme_tree().by_id.get(theme_id)
+    if node is None:
+        invalidate_theme_tree()
+        node = get_theme_tree().by_id.get(theme_id)
+    return node
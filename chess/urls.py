@@ -10,6 +10,9 @@ urlpatterns = [
 
     # Enviar resultado del puzzle (POST)
     path("puzzle/submit/", views.submit_puzzle, name="submit_puzzle"),
+
+    # Enviar resultado y recibir el siguiente puzzle (POST, JSON)
+    path("puzzle/next/", views.submit_and_next, name="submit_and_next"),
     path("history/", views.puzzle_history, name="puzzle_history"),
     path("themes/", views.theme_overview, name="theme_overview"),
 ]
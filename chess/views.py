@@ -1,6 +1,5 @@
 from datetime import date
 import json
-import random
 from django.utils import timezone
 from django.contrib.auth.decorators import login_required
 from django.db.models import Sum
@@ -10,21 +9,144 @@ from django.views.decorators.http import require_POST
 from django.utils.timezone import make_aware
 from datetime import datetime
 from django.db.models import Count, Q
-from django.db.models import Prefetch
 from django.db import transaction
 from .models import (
     TrainingPreferences,
     TrainingCycle,
-    TrainingCycleTheme,
     ThemeElo,
     PuzzleAttempt,
     ActiveExercise,
-    RetryPuzzle,
     Elo,
-    Theme,
 )
-from .utils import get_week_cycle_dates, pick_cycle_theme
 from .repository import LichessDB
+from .puzzle_queue import pop_puzzle, refill_queue
+from .cycle_cache import get_current_cycle
+from .theme_tree import get_theme_node, get_theme_tree
+from .overview_cache import get_theme_overview, invalidate_overview
+from .retries import due_counts, record_failure, record_success
+
+
+def _served_fields(puzzle):
+    """
+    Campos de ActiveExercise que se copian del puzzle al servirlo.
+
+    Los temas salen de theme_mask y del mapa de themes en memoria;
+    los ids sobrantes de puzzle_themes llegan en la misma fila del
+    puzzle (PUZZLE_COLUMNS_WITH_THEMES), sin otra consulta.
+    """
+    return {
+        "puzzle_id": puzzle.puzzle_id,
+        "puzzle_rating": puzzle.rating,
+        "theme_ids": get_theme_tree().ids_for_lichess_names(puzzle.themes),
+    }
+
+
+def _record_result(user, active, solved, cycle, db):
+    """
+    Registra el intento, actualiza retry, ciclo y Elos.
+    Devuelve los cambios de Elo para mostrar.
+
+    Rating y temas salen del ActiveExercise; la base de Lichess solo
+    se lee para ejercicios servidos antes de guardarlos.
+    """
+    puzzle_id = active.puzzle_id
+    tree = get_theme_tree()
+
+    puzzle_rating = active.puzzle_rating
+    theme_ids = active.theme_ids
+    if puzzle_rating is None:
+        # Antes de la primera escritura: en SQLite la transacción
+        # toma el lock de escritura con el primer INSERT/UPDATE
+        puzzle_data = db.get_puzzle_by_id(puzzle_id)
+        puzzle_rating = puzzle_data.rating
+        theme_ids = tree.ids_for_lichess_names(puzzle_data.themes)
+
+    PuzzleAttempt.objects.create(
+        user=user,
+        puzzle_id=puzzle_id,
+        solved=solved,
+        puzzle_rating=puzzle_rating,
+        theme_ids=theme_ids,
+    )
+
+    if solved:
+        record_success(user, puzzle_id)
+    else:
+        record_failure(user, puzzle_id)
+
+    if solved and cycle:
+        cycle.completed_puzzles += 1
+        cycle.save(update_fields=["completed_puzzles"])
+
+    score = 1.0 if solved else 0.0
+
+    elo_changes = []
+
+    user_elo = Elo.objects.select_for_update().get(user=user)
+    old_general = user_elo.elo
+
+    user_elo.update_elo(
+        opponent_elo=puzzle_rating,
+        score=score,
+    )
+
+    elo_changes.append({
+        "name": "General",
+        "old": old_general,
+        "new": user_elo.elo,
+    })
+
+    theme_elos = {
+        te.theme_id: te
+        for te in ThemeElo.objects.filter(
+            user=user,
+            theme_id__in=theme_ids
+        ).select_for_update()
+    }
+
+    # Todos los temas en un UPDATE: menos tiempo con el lock de escritura
+    changes = ThemeElo.bulk_update_elo(
+        [theme_elos[theme_id] for theme_id in theme_ids if theme_id in theme_elos],
+        opponent_elo=puzzle_rating,
+        score=score,
+    )
+
+    for theme_elo, old_elo in changes:
+        # theme_ids puede traer temas más nuevos que el snapshot
+        node = get_theme_node(theme_elo.theme_id)
+        elo_changes.append({
+            "name": node.name if node else theme_elo.theme.name,
+            "old": old_elo,
+            "new": theme_elo.elo,
+        })
+
+    # bulk_update no envía post_save
+    invalidate_overview(user.pk)
+
+    return elo_changes
+
+
+def _lock_active(user, puzzle_id):
+    """
+    ActiveExercise del usuario bloqueado, o None si no coincide.
+    """
+    active = (
+        ActiveExercise.objects
+        .select_for_update()
+        .filter(user=user)
+        .first()
+    )
+
+    if not active or active.puzzle_id != puzzle_id:
+        return None
+    return active
+
+
+def _invalid_active():
+    return JsonResponse(
+        {"status": "error", "message": "Puzzle activo inválido"},
+        status=400,
+    )
 
 
 @login_required
@@ -33,15 +155,7 @@ def get_puzzle(request):
     today = date.today()
     db = LichessDB()
 
-    start_date, end_date = get_week_cycle_dates(today)
-
-    cycle, _ = TrainingCycle.objects.get_or_create(
-        user=user,
-        start_date=start_date,
-        end_date=end_date,
-    )
-
-    cycle_themes = cycle.themes.select_related("theme")
+    cycle, cycle_themes = get_current_cycle(user, today)
 
     # --------------------------------------------------
     # 1. Puzzle activo
@@ -62,43 +176,12 @@ def get_puzzle(request):
         # Puzzle inválido → limpiar y continuar
         active.delete()
 
-    puzzle = None
-
     # --------------------------------------------------
-    # 2. Retry puzzle (best effort)
+    # 2. Siguiente de la cola (retry o puzzle por tema + elo)
     # --------------------------------------------------
-    retry = (
-        RetryPuzzle.objects
-        .filter(user=user)
-        .order_by("-fail_count", "last_attempt_at")
-        .first()
-    )
-
-    if retry and random.random() < 0.1:
-        puzzle = db.get_puzzle_by_id(retry.puzzle_id)
+    puzzle = pop_puzzle(user, cycle_themes, db)
 
-    # --------------------------------------------------
-    # 3. Puzzle por tema + elo
-    # --------------------------------------------------
-    if not puzzle:
-        cycle_theme = pick_cycle_theme(cycle_themes)
-        theme = cycle_theme.theme
-
-        theme_elo = ThemeElo.objects.get(user=user, theme=theme)
-
-        for delta in (50, 150, 300):
-            puzzle = db.get_random_puzzle(
-                rating_min=max(0, theme_elo.elo - delta),
-                rating_max=theme_elo.elo + delta,
-                themes=[theme.lichess_name],
-            )
-            if puzzle:
-                break
-
-    ActiveExercise.objects.create(
-        user=user,
-        puzzle_id=puzzle["puzzle_id"],
-    )
+    ActiveExercise.objects.create(user=user, **_served_fields(puzzle))
 
     return render(
         request,
@@ -121,39 +204,11 @@ def submit_puzzle(request):
     puzzle_id = data.get("puzzle_id")
     solved = bool(data.get("solved"))
 
-    active = (
-        ActiveExercise.objects
-        .select_for_update()
-        .filter(user=user)
-        .first()
-    )
-
-    if not active or active.puzzle_id != puzzle_id:
-        return JsonResponse(
-            {"status": "error", "message": "Puzzle activo inválido"},
-            status=400,
-        )
-
-    active.delete()
-
-    PuzzleAttempt.objects.create(
-        user=user,
-        puzzle_id=puzzle_id,
-        solved=solved,
-    )
-
-    if solved:
-        RetryPuzzle.objects.filter(
-            user=user,
-            puzzle_id=puzzle_id,
-        ).delete()
-    else:
-        RetryPuzzle.objects.update_or_create(
-            user=user,
-            puzzle_id=puzzle_id,
-            defaults={"fail_count": 1},
-        )
+    active = _lock_active(user, puzzle_id)
+    if not active:
+        return _invalid_active()
 
+    cycle = None
     if solved:
         today = date.today()
         cycle = (
@@ -167,68 +222,85 @@ def submit_puzzle(request):
             .first()
         )
 
-        if cycle:
-            cycle.completed_puzzles += 1
-            cycle.save(update_fields=["completed_puzzles"])
-
     db = LichessDB()
-    puzzle_data = db.get_puzzle_by_id(puzzle_id)
-
-    puzzle_rating = puzzle_data["rating"]
-    puzzle_themes = puzzle_data["themes"]
-    score = 1.0 if solved else 0.0
+    elo_changes = _record_result(user, active, solved, cycle, db)
 
-    elo_changes = []
+    # Después de _record_result: el lookup de Lichess que puede hacer
+    # (ejercicios antiguos) va antes de la primera escritura
+    active.delete()
 
-    user_elo = Elo.objects.select_for_update().get(user=user)
-    old_general = user_elo.elo
+    # Reposición de la cola (el navegador usa submit_and_next),
+    # tras el commit: los muestreos no retienen el lock de escritura
+    _, cycle_themes = get_current_cycle(user)
+    transaction.on_commit(
+        lambda: refill_queue(user, cycle_themes, db), robust=True
+    )
 
-    user_elo.update_elo(
-        opponent_elo=puzzle_rating,
-        score=score,
+    return JsonResponse(
+        {
+            "status": "ok",
+            "solved": solved,
+            "elo_changes": elo_changes,
+        }
     )
 
-    elo_changes.append({
-        "name": "General",
-        "old": old_general,
-        "new": user_elo.elo,
-    })
 
-    themes = Theme.objects.filter(
-        lichess_name__in=puzzle_themes
-    )
+@login_required
+@require_POST
+@transaction.atomic
+def submit_and_next(request):
+    """
+    submit_puzzle + siguiente puzzle en la misma respuesta
+    (y la misma transacción): el siguiente queda asignado como
+    ActiveExercise y el navegador lo pinta sin recargar la página.
+    """
+    user = request.user
+    data = json.loads(request.body)
 
-    theme_elos = {
-        te.theme_id: te
-        for te in ThemeElo.objects.filter(
-            user=user,
-            theme__in=themes
-        ).select_for_update()
-    }
+    puzzle_id = data.get("puzzle_id")
+    solved = bool(data.get("solved"))
 
-    for theme in themes:
-        theme_elo = theme_elos.get(theme.id)
-        if not theme_elo:
-            continue  # por seguridad extrema
+    active = _lock_active(user, puzzle_id)
+    if not active:
+        return _invalid_active()
 
-        old_elo = theme_elo.elo
+    db = LichessDB()
 
-        theme_elo.update_elo(
-            opponent_elo=puzzle_rating,
-            score=score,
-        )
+    # El ciclo de la semana sirve para contar y para elegir el siguiente;
+    # los temas salen de la cache, la fila se bloquea para contar
+    cycle, cycle_themes = get_current_cycle(user, for_update=True)
 
-        elo_changes.append({
-            "name": theme.name,
-            "old": old_elo,
-            "new": theme_elo.elo,
-        })
+    elo_changes = _record_result(user, active, solved, cycle, db)
+
+    puzzle = pop_puzzle(user, cycle_themes, db)
+
+    # Se reutiliza la fila: un UPDATE en vez de DELETE + INSERT
+    next_puzzle = None
+    if puzzle:
+        fields = _served_fields(puzzle)
+        for name, value in fields.items():
+            setattr(active, name, value)
+        active.created_at = timezone.now()
+        active.save(update_fields=[*fields, "created_at"])
+        next_puzzle = puzzle.to_dict(themes=False)
+    else:
+        active.delete()
+
+    # Como en submit_puzzle: fuera de la transacción
+    transaction.on_commit(
+        lambda: refill_queue(user, cycle_themes, db), robust=True
+    )
 
     return JsonResponse(
         {
             "status": "ok",
             "solved": solved,
             "elo_changes": elo_changes,
+            "cycle": {
+                "completed_puzzles": cycle.completed_puzzles,
+                "total_puzzles": cycle.total_puzzles,
+            },
+            "next": next_puzzle,
         }
     )
 
@@ -238,43 +310,30 @@ def home(request):
     user = request.user
     today = date.today()
 
-    start_date, end_date = get_week_cycle_dates(today)
-
-    # El ciclo se autocrea y configura vía signals
-    cycle, _ = TrainingCycle.objects.get_or_create(
-        user=user,
-        start_date=start_date,
-        end_date=end_date,
-    )
+    # Ciclo y temas (ordenados por prioridad) desde la cache semanal
+    cycle, cycle_themes = get_current_cycle(user, today)
 
     # Elo general
     user_elo = Elo.objects.get(user=user)
 
-    # Temas del ciclo (una sola query optimizada)
-    cycle_themes = (
-        TrainingCycleTheme.objects
-        .filter(cycle=cycle)
-        .select_related("theme")
-        .order_by("priority")
-    )
-
-    # Elos por categoría principal (una sola query)
+    # Elos por categoría principal (una sola query; ids desde el snapshot)
+    tree = get_theme_tree()
     category_elos = (
         ThemeElo.objects
         .filter(
             user=user,
-            theme__lichess_name__in=[
+            theme_id__in=tree.ids_for_lichess_names([
                 "opening",
                 "middlegame",
                 "endgame",
                 "mate",
-            ]
+            ])
         )
-        .select_related("theme")
+        .select_related("theme")  # el template muestra theme.name
     )
 
     elo_map = {
-        te.theme.lichess_name: te
+        tree.by_id[te.theme_id].lichess_name: te
         for te in category_elos
     }
 
@@ -286,6 +345,7 @@ def home(request):
         "endgame": elo_map.get("endgame"),
         "mate": elo_map.get("mate"),
         "cycle_themes": cycle_themes,
+        "due_retries": due_counts([user.pk]).get(user.pk, 0),
     }
 
     return render(request, "home.html", context)
@@ -339,94 +399,8 @@ def puzzle_history(request):
 
 @login_required
 def theme_overview(request):
-    user = request.user
-
-    user_theme_elos = ThemeElo.objects.filter(user=user)
-
-    # =========================
-    # CATEGORÍAS ENTRENABLES
-    # =========================
-    trainable_categories = (
-        Theme.objects
-        .filter(parent__isnull=True)
-        .prefetch_related(
-            # Elo de la categoría (si existe)
-            Prefetch(
-                "themeelo_set",
-                queryset=user_theme_elos,
-                to_attr="category_elo"
-            ),
-            # SOLO subtemas entrenables
-            Prefetch(
-                "subthemes",
-                queryset=(
-                    Theme.objects
-                    .filter(is_trainable=True)
-                    .prefetch_related(
-                        Prefetch(
-                            "themeelo_set",
-                            queryset=user_theme_elos,
-                            to_attr="theme_elo"
-                        )
-                    )
-                ),
-                to_attr="trainable_subthemes"
-            )
-        )
-        .order_by("name")
-    )
-
-    # Filtrar: solo categorías que realmente tengan temas entrenables
-    trainable_categories = [
-        c for c in trainable_categories
-        if c.trainable_subthemes
-    ]
-
-    # =========================
-    # CATEGORÍAS NO ENTRENABLES
-    # =========================
-    non_trainable_categories = (
-        Theme.objects
-        .filter(parent__isnull=True)
-        .prefetch_related(
-            Prefetch(
-                "themeelo_set",
-                queryset=user_theme_elos,
-                to_attr="category_elo"
-            ),
-            # TODOS los subtemas NO entrenables
-            Prefetch(
-                "subthemes",
-                queryset=(
-                    Theme.objects
-                    .filter(is_trainable=False)
-                    .prefetch_related(
-                        Prefetch(
-                            "themeelo_set",
-                            queryset=user_theme_elos,
-                            to_attr="theme_elo"
-                        )
-                    )
-                ),
-                to_attr="trainable_subthemes"
-            )
-        )
-        .order_by("name")
-    )
-
-    # Filtrar:
-    # - que tenga temas
-    # - que NO tenga ningún tema entrenable
-    non_trainable_categories = [
-        c for c in non_trainable_categories
-        if c.trainable_subthemes and c.subthemes.filter(is_trainable=False).exists()
-    ]
-
     return render(
         request,
         "theme_overview.html",
-        {
-            "trainable_categories": trainable_categories,
-            "non_trainable_categories": non_trainable_categories,
-        }
+        {"content": get_theme_overview(request.user)},
     )
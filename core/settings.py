@@ -56,6 +56,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'chess.middleware.LichessDBMiddleware',
 ]
 
 ROOT_URLCONF = 'core.urls'
@@ -89,6 +90,71 @@ DATABASES = {
 }
 
 
+# Cache de Django compartida entre workers: las invalidaciones (signals,
+# comandos de management) tienen que llegar a todos los procesos.
+# Con DJANGO_REDIS_URL se usa Redis (requiere el paquete redis); si no,
+# archivos en disco, compartidos por los procesos de la máquina.
+if os.environ.get("DJANGO_REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["DJANGO_REDIS_URL"],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.environ.get("DJANGO_CACHE_DIR", BASE_DIR / "cache"),
+            "OPTIONS": {"MAX_ENTRIES": 100000},
+        }
+    }
+
+
+# Base de datos de puzzles de Lichess (solo lectura, una conexión por hilo)
+LICHESS_DB_PATH = BASE_DIR / "lichess_puzzles.sqlite3"
+
+# Manifest de snapshots versionados (import_lichess_puzzles.py --snapshot).
+# Si existe, indica el archivo activo y tiene prioridad sobre LICHESS_DB_PATH.
+LICHESS_DB_MANIFEST = BASE_DIR / "lichess_puzzles.json"
+
+# immutable=1 evita los locks de lectura; solo si el archivo
+# no se modifica mientras el proceso está vivo (p. ej. con snapshots).
+LICHESS_DB_IMMUTABLE = os.environ.get("LICHESS_DB_IMMUTABLE", "") == "True"
+
+LICHESS_DB_PRAGMAS = {
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -32000,  # en KiB
+    "temp_store": "MEMORY",
+    "query_only": 1,
+}
+
+# Cache LRU en memoria de puzzles por id (por proceso)
+LICHESS_CACHE_SIZE = 4096
+LICHESS_CACHE_TTL = 60 * 60  # segundos; None = sin expiración
+
+# Cola de puzzles preseleccionados por usuario
+PUZZLE_QUEUE_SIZE = 10
+PUZZLE_QUEUE_REFILL = 2  # puzzles que se añaden tras cada submit
+PUZZLE_QUEUE_ELO_DRIFT = 100  # si el Elo del tema se mueve más, se descarta
+
+# Temas del ciclo semanal cacheados por usuario (cache de Django)
+TRAINING_CYCLE_CACHE_TIMEOUT = 7 * 24 * 60 * 60
+
+# Snapshot en memoria de la jerarquía de Theme (por proceso). Se rehace
+# con las signals de Theme; el TTL cubre cambios hechos en otros procesos.
+THEME_TREE_TTL = 5 * 60  # segundos; None = solo signals
+
+# HTML de theme_overview cacheado por usuario; se invalida con sus Elos
+# (con una cache por proceso, LocMemCache, se acota a 5 minutos)
+THEME_OVERVIEW_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Repetición espaciada de puzzles fallados (en días)
+RETRY_FIRST_INTERVAL = 1  # tras un fallo
+RETRY_GRADUATION_INTERVAL = 30  # al superarlo, el retry se elimina
+RETRY_MAX_PER_USER = 200  # se descartan los más lejanos
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
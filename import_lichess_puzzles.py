@@ -1,29 +1,75 @@
+import argparse
+import bz2
 import csv
+import gzip
+import hashlib
+import io
+import itertools
+import json
+import os
 import sqlite3
 import random
+import time
+from collections import deque
+from multiprocessing import Pool
 from pathlib import Path
 
+from chess.encoding import pack_fen, pack_moves
+
 # ----- CONFIG -----
 CSV_FILE = "lichess_db_puzzle.csv"
+# El dump de Lichess se publica como .csv.zst; se lee en streaming
+COMPRESSED_SUFFIXES = (".zst", ".gz", ".bz2")
 SQLITE_FILE = "lichess_puzzles.sqlite3"
 rating_deviation_threshold = 75
 min_rating = 0
 BATCH_SIZE = 5000
+BULK_BATCH_SIZE = 50000
+PARSE_CHUNK_LINES = 20000
+RATING_BUCKET = 50
+# Bits disponibles para la máscara de themes (INTEGER con signo de SQLite)
+MAX_THEME_BITS = 63
+# Snapshots anteriores que se conservan (workers que aún no cambiaron)
+KEEP_SNAPSHOTS = 2
 
 
 def create_tables(cursor):
+    had_openings = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'openings'"
+    ).fetchone()
+
+    # Tablas de muestreo anteriores a la franja de rating en la clave:
+    # no se pueden alterar (es la PK), se rehacen desde puzzles
+    sample_columns = {
+        r[1] for r in cursor.execute("PRAGMA table_info(puzzle_samples)")
+    }
+    rebuild_samples = bool(sample_columns) and "bucket" not in sample_columns
+    if rebuild_samples:
+        cursor.executescript("""
+            DROP TABLE puzzle_samples;
+            DROP TABLE IF EXISTS opening_samples;
+        """)
+
     cursor.executescript("""
         CREATE TABLE IF NOT EXISTS puzzles (
             puzzle_id TEXT PRIMARY KEY,
             fen TEXT NOT NULL,
             moves TEXT NOT NULL,
             rating INTEGER NOT NULL,
-            rnd INTEGER NOT NULL
+            rnd INTEGER NOT NULL,
+            fingerprint INTEGER,
+            theme_mask INTEGER NOT NULL DEFAULT 0,
+            side_to_move TEXT,
+            orientation TEXT,
+            plies INTEGER
         );
 
+        -- bit: posición en puzzles.theme_mask (NULL = sin bit;
+        -- esos themes van en puzzle_themes)
         CREATE TABLE IF NOT EXISTS themes (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT UNIQUE NOT NULL
+            name TEXT UNIQUE NOT NULL,
+            bit INTEGER
         );
 
         CREATE TABLE IF NOT EXISTS puzzle_themes (
@@ -33,29 +79,509 @@ def create_tables(cursor):
             FOREIGN KEY (puzzle_id) REFERENCES puzzles(puzzle_id),
             FOREIGN KEY (theme_id) REFERENCES themes(id)
         );
+
+        -- Tags de apertura: tablas propias, fuera de themes, para que
+        -- puzzle_themes y puzzle_samples queden solo con lo táctico
+        CREATE TABLE IF NOT EXISTS openings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS puzzle_openings (
+            puzzle_id TEXT NOT NULL,
+            opening_id INTEGER NOT NULL,
+            PRIMARY KEY (puzzle_id, opening_id),
+            FOREIGN KEY (puzzle_id) REFERENCES puzzles(puzzle_id),
+            FOREIGN KEY (opening_id) REFERENCES openings(id)
+        ) WITHOUT ROWID;
+
+        -- Tabla de muestreo por tema. Al ser WITHOUT ROWID la clave
+        -- primaria es el propio índice cubriente. bucket es la franja
+        -- de rating (rating / RATING_BUCKET, las de rating_buckets):
+        -- el pick en una franja es un seek por (tema, franja, rnd),
+        -- sin recorrer puzzles de otros ratings.
+        CREATE TABLE IF NOT EXISTS puzzle_samples (
+            theme_id INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            rnd INTEGER NOT NULL,
+            puzzle_id TEXT NOT NULL,
+            rating INTEGER NOT NULL,
+            plies INTEGER,
+            PRIMARY KEY (theme_id, bucket, rnd, puzzle_id)
+        ) WITHOUT ROWID;
+
+        -- Igual que puzzle_samples, por apertura
+        CREATE TABLE IF NOT EXISTS opening_samples (
+            opening_id INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            rnd INTEGER NOT NULL,
+            puzzle_id TEXT NOT NULL,
+            rating INTEGER NOT NULL,
+            plies INTEGER,
+            PRIMARY KEY (opening_id, bucket, rnd, puzzle_id)
+        ) WITHOUT ROWID;
+
+        -- Conteo de puzzles por tema y franja de rating.
+        -- theme_id = 0 agrupa todos los puzzles.
+        CREATE TABLE IF NOT EXISTS rating_buckets (
+            theme_id INTEGER NOT NULL,
+            rating_from INTEGER NOT NULL,
+            rating_to INTEGER NOT NULL,
+            puzzles INTEGER NOT NULL,
+            PRIMARY KEY (theme_id, rating_from)
+        ) WITHOUT ROWID;
+    """)
+
+    # Bases creadas antes de existir estas columnas
+    columns = {r[1] for r in cursor.execute("PRAGMA table_info(puzzles)")}
+    if "fingerprint" not in columns:
+        cursor.execute("ALTER TABLE puzzles ADD COLUMN fingerprint INTEGER")
+    if "theme_mask" not in columns:
+        cursor.execute(
+            "ALTER TABLE puzzles ADD COLUMN theme_mask INTEGER NOT NULL DEFAULT 0"
+        )
+    if "plies" not in columns:
+        cursor.executescript("""
+            ALTER TABLE puzzles ADD COLUMN side_to_move TEXT;
+            ALTER TABLE puzzles ADD COLUMN orientation TEXT;
+            ALTER TABLE puzzles ADD COLUMN plies INTEGER;
+
+            UPDATE puzzles
+            SET side_to_move = substr(fen, instr(fen, ' ') + 1, 1),
+                plies = length(moves) - length(replace(moves, ' ', '')) + 1;
+
+            UPDATE puzzles
+            SET orientation = CASE side_to_move WHEN 'b' THEN 'white' ELSE 'black' END;
+        """)
+
+    columns = {r[1] for r in cursor.execute("PRAGMA table_info(themes)")}
+    had_bits = "bit" in columns
+    if not had_bits:
+        cursor.execute("ALTER TABLE themes ADD COLUMN bit INTEGER")
+
+    if not had_openings:
+        migrate_openings(cursor)
+
+    # Después de sacar las aperturas de themes: no deben recibir bit
+    if not had_bits:
+        migrate_theme_bits(cursor)
+
+    if rebuild_samples:
+        build_sample_table(cursor)
+
+
+def migrate_openings(cursor):
+    """
+    Bases anteriores: los tags de apertura estaban en themes sin bit.
+    En Lichess los themes empiezan en minúscula y las aperturas en
+    mayúscula (Sicilian_Defense), así se distinguen.
+    """
+    cursor.executescript(f"""
+        CREATE TEMP TABLE opening_themes AS
+        SELECT id, name FROM themes
+        WHERE bit IS NULL AND name GLOB '[A-Z]*';
+
+        INSERT OR IGNORE INTO openings (name)
+        SELECT name FROM opening_themes ORDER BY id;
+
+        INSERT OR IGNORE INTO puzzle_openings (puzzle_id, opening_id)
+        SELECT pt.puzzle_id, o.id
+        FROM puzzle_themes pt
+        JOIN opening_themes ot ON ot.id = pt.theme_id
+        JOIN openings o ON o.name = ot.name;
+
+        DELETE FROM puzzle_themes
+        WHERE theme_id IN (SELECT id FROM opening_themes);
+        DELETE FROM puzzle_samples
+        WHERE theme_id IN (SELECT id FROM opening_themes);
+        DELETE FROM rating_buckets
+        WHERE theme_id IN (SELECT id FROM opening_themes);
+        DELETE FROM themes
+        WHERE id IN (SELECT id FROM opening_themes);
+
+        INSERT OR IGNORE INTO opening_samples
+        (opening_id, bucket, rnd, puzzle_id, rating, plies)
+        SELECT * FROM ({PUZZLE_OPENING_PAIRS.format(where="")});
+
+        DROP TABLE temp.opening_themes;
     """)
 
 
-def get_or_create_theme(cursor, name):
-    cursor.execute("SELECT id FROM themes WHERE name = ?", (name,))
-    row = cursor.fetchone()
-    if row:
-        return row[0]
+def migrate_theme_bits(cursor):
+    """
+    Bases anteriores a la máscara: todos los themes estaban en
+    puzzle_themes. Se les asigna bit por orden de id (el mismo orden
+    de aparición que usa el import bulk) y sus filas pasan a
+    puzzles.theme_mask; puzzle_themes queda solo con los sobrantes.
+    """
+    cursor.executescript(f"""
+        CREATE TEMP TABLE theme_bits AS
+        SELECT id,
+               (SELECT COUNT(bit) FROM themes)
+               + ROW_NUMBER() OVER (ORDER BY id) - 1 AS bit
+        FROM themes
+        WHERE bit IS NULL;
+
+        DELETE FROM temp.theme_bits WHERE bit >= {MAX_THEME_BITS};
+
+        UPDATE themes
+        SET bit = (SELECT b.bit FROM theme_bits b WHERE b.id = themes.id)
+        WHERE id IN (SELECT id FROM theme_bits);
+
+        CREATE TEMP TABLE puzzle_bits (
+            puzzle_id TEXT PRIMARY KEY,
+            mask INTEGER NOT NULL
+        ) WITHOUT ROWID;
+
+        INSERT INTO puzzle_bits (puzzle_id, mask)
+        SELECT pt.puzzle_id, SUM(1 << b.bit)
+        FROM puzzle_themes pt
+        JOIN theme_bits b ON b.id = pt.theme_id
+        GROUP BY pt.puzzle_id;
+
+        UPDATE puzzles
+        SET theme_mask = theme_mask | (
+            SELECT pb.mask FROM puzzle_bits pb
+            WHERE pb.puzzle_id = puzzles.puzzle_id
+        )
+        WHERE puzzle_id IN (SELECT puzzle_id FROM puzzle_bits);
+
+        DELETE FROM puzzle_themes
+        WHERE theme_id IN (SELECT id FROM theme_bits);
+
+        DROP TABLE temp.puzzle_bits;
+        DROP TABLE temp.theme_bits;
+    """)
+
+
+def create_indexes(cursor):
+    # Random sin filtro de tema: seek por rnd con rating en el índice
+    cursor.executescript("""
+        CREATE INDEX IF NOT EXISTS idx_puzzles_rnd_rating_plies
+        ON puzzles (rnd, rating, plies);
+
+        -- Puzzles de una apertura (la PK va por puzzle)
+        CREATE INDEX IF NOT EXISTS idx_puzzle_openings_opening
+        ON puzzle_openings (opening_id, puzzle_id);
+
+        DROP INDEX IF EXISTS idx_puzzles_rnd_rating;
+    """)
+
+
+# Pares (theme_id, puzzle) de la máscara y de puzzle_themes
+PUZZLE_THEME_PAIRS = f"""
+    SELECT t.id AS theme_id, p.rating / {RATING_BUCKET} AS bucket,
+           p.rnd, p.puzzle_id, p.rating, p.plies
+    FROM puzzles p
+    JOIN themes t
+      ON t.bit IS NOT NULL AND (p.theme_mask >> t.bit) & 1
+    {{where}}
+    UNION ALL
+    SELECT pt.theme_id, p.rating / {RATING_BUCKET},
+           p.rnd, p.puzzle_id, p.rating, p.plies
+    FROM puzzle_themes pt
+    JOIN puzzles p ON p.puzzle_id = pt.puzzle_id
+    {{where}}
+"""
+
+
+# Pares (opening_id, puzzle) de puzzle_openings
+PUZZLE_OPENING_PAIRS = f"""
+    SELECT po.opening_id, p.rating / {RATING_BUCKET} AS bucket,
+           p.rnd, p.puzzle_id, p.rating, p.plies
+    FROM puzzle_openings po
+    JOIN puzzles p ON p.puzzle_id = po.puzzle_id
+    {{where}}
+"""
+
+
+def build_sample_table(cursor):
+    """
+    Reconstruye puzzle_samples a partir de la máscara de puzzles
+    y de puzzle_themes, y opening_samples desde puzzle_openings.
+    """
+    cursor.execute("DELETE FROM puzzle_samples")
+    cursor.execute(f"""
+        INSERT INTO puzzle_samples (theme_id, bucket, rnd, puzzle_id, rating, plies)
+        SELECT * FROM ({PUZZLE_THEME_PAIRS.format(where="")})
+        ORDER BY 1, 2, 3
+    """)
+
+    cursor.execute("DELETE FROM opening_samples")
+    cursor.execute(f"""
+        INSERT INTO opening_samples (opening_id, bucket, rnd, puzzle_id, rating, plies)
+        SELECT * FROM ({PUZZLE_OPENING_PAIRS.format(where="")})
+        ORDER BY 1, 2, 3
+    """)
+
+
+def build_rating_buckets(cursor):
+    """
+    Reconstruye rating_buckets (franjas de RATING_BUCKET puntos).
+    """
+    cursor.execute("DELETE FROM rating_buckets")
+    cursor.execute("""
+        INSERT INTO rating_buckets (theme_id, rating_from, rating_to, puzzles)
+        SELECT theme_id, bucket * :w, bucket * :w + :w - 1, COUNT(*)
+        FROM puzzle_samples
+        GROUP BY theme_id, bucket
+    """, {"w": RATING_BUCKET})
+    cursor.execute("""
+        INSERT INTO rating_buckets (theme_id, rating_from, rating_to, puzzles)
+        SELECT 0, (rating / :w) * :w, (rating / :w) * :w + :w - 1, COUNT(*)
+        FROM puzzles
+        GROUP BY rating / :w
+    """, {"w": RATING_BUCKET})
+
+
+def load_themes(cursor):
+    """
+    name -> (id, bit) de los themes ya existentes.
+    """
+    return {
+        name: (theme_id, bit)
+        for theme_id, name, bit in cursor.execute(
+            "SELECT id, name, bit FROM themes"
+        )
+    }
+
+
+def get_or_create_theme(cursor, theme_ids, name):
+    """
+    Devuelve (id, bit). Un theme nuevo recibe el siguiente bit libre
+    de la máscara; el bit no cambia nunca después (las filas ya
+    escritas dependen de él).
+    """
+    theme = theme_ids.get(name)
+    if theme is not None:
+        return theme
+
+    bit = None
+    used = sum(1 for _, b in theme_ids.values() if b is not None)
+    if used < MAX_THEME_BITS:
+        bit = used
 
     cursor.execute(
-        "INSERT INTO themes (name) VALUES (?)",
-        (name,)
+        "INSERT INTO themes (name, bit) VALUES (?, ?)",
+        (name, bit)
     )
-    return cursor.lastrowid
+    theme = theme_ids[name] = (cursor.lastrowid, bit)
+    return theme
 
 
-def convert_csv_to_sqlite():
-    csv_path = Path(CSV_FILE)
-    if not csv_path.exists():
-        print(f"ERROR: No se encontró {CSV_FILE}")
+def encode_themes(cursor, theme_ids, puzzle_id, themes):
+    """
+    Máscara de bits de los themes + filas de puzzle_themes para
+    los que no tienen bit (sobrantes).
+    """
+    mask = 0
+    rows = []
+
+    for name in themes:
+        theme_id, bit = get_or_create_theme(cursor, theme_ids, name)
+        if bit is None:
+            rows.append((puzzle_id, theme_id))
+        else:
+            mask |= 1 << bit
+
+    return mask, rows
+
+
+def load_openings(cursor):
+    """
+    name -> id de las aperturas ya existentes.
+    """
+    return {
+        name: opening_id
+        for opening_id, name in cursor.execute("SELECT id, name FROM openings")
+    }
+
+
+def encode_openings(cursor, opening_ids, puzzle_id, openings):
+    """
+    Filas de puzzle_openings; crea las aperturas nuevas.
+    """
+    rows = []
+
+    for name in openings:
+        opening_id = opening_ids.get(name)
+        if opening_id is None:
+            cursor.execute("INSERT INTO openings (name) VALUES (?)", (name,))
+            opening_id = opening_ids[name] = cursor.lastrowid
+        rows.append((puzzle_id, opening_id))
+
+    return rows
+
+
+# =====================================================
+# Lectura del CSV (plano o comprimido, en streaming)
+# =====================================================
+def find_csv(csv_file):
+    """
+    Devuelve la ruta del CSV; si no existe en plano,
+    prueba las variantes comprimidas (.zst, .gz, .bz2).
+    """
+    path = Path(csv_file)
+    if path.exists():
+        return path
+
+    for suffix in COMPRESSED_SUFFIXES:
+        candidate = path.with_name(path.name + suffix)
+        if candidate.exists():
+            return candidate
+
+    return None
+
+
+def open_csv(path):
+    """
+    Abre el CSV como texto decodificando al vuelo según la extensión.
+    Memoria constante y sin archivo temporal.
+    """
+    path = Path(path)
+
+    if path.suffix == ".zst":
+        try:
+            import zstandard
+        except ImportError:
+            raise SystemExit(
+                "ERROR: para leer .zst instala zstandard (pip install zstandard)"
+            )
+
+        raw = open(path, "rb")
+        reader = zstandard.ZstdDecompressor(
+            max_window_size=2**31
+        ).stream_reader(raw, closefd=True)
+        return io.TextIOWrapper(reader, encoding="utf-8", newline="")
+
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+
+    if path.suffix == ".bz2":
+        return bz2.open(path, "rt", encoding="utf-8", newline="")
+
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def fingerprint(rating, moves, themes):
+    """
+    Huella del contenido de un puzzle (entero de 64 bits con signo).
+    """
+    data = f"{rating}|{moves}|{' '.join(themes)}".encode()
+    digest = hashlib.blake2b(data, digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def orientation(side_to_move):
+    # El tablero se muestra desde el bando que resuelve (el que no mueve primero)
+    return "white" if side_to_move == "b" else "black"
+
+
+def parse_row(row, compact=False):
+    """
+    Aplica el filtro de estabilidad y devuelve
+    (puzzle_id, fen, moves, rating, side_to_move, plies,
+     themes, openings, fingerprint)
+    o None si se descarta.
+
+    Con compact, fen y moves van codificados en bytes
+    (chess.encoding); si no se pueden codificar, quedan en texto.
+    """
+    try:
+        rating = int(row["Rating"])
+        if int(row["RatingDeviation"]) >= rating_deviation_threshold or rating < min_rating:
+            return None
+    except Exception:
+        return None
+
+    themes = set(row["Themes"].split())
+    openings = set(row["OpeningTags"].split()) - themes
+    moves = row["Moves"]
+    fen = row["FEN"]
+
+    stored_fen, stored_moves = fen, moves
+    if compact:
+        try:
+            stored_fen, stored_moves = pack_fen(fen), pack_moves(moves)
+        except ValueError:
+            pass
+
+    # Orden estable: los ids de themes no dependen del hash del proceso
+    return (
+        row["PuzzleId"],
+        stored_fen,
+        stored_moves,
+        rating,
+        fen.split()[1],
+        len(moves.split()),
+        tuple(sorted(themes)),
+        tuple(sorted(openings)),
+        fingerprint(rating, moves, sorted(themes | openings)),
+    )
+
+
+# =====================================================
+# Parseo en paralelo (workers) con un único escritor
+# =====================================================
+_header = None
+_compact = False
+
+
+def _init_worker(header, compact=False):
+    global _header, _compact
+    _header = header
+    _compact = compact
+
+
+def parse_chunk(lines):
+    """
+    Parsea un bloque de líneas crudas del CSV.
+    Devuelve una tupla compacta por fila (None si se descarta).
+    """
+    return [
+        parse_row(row, _compact)
+        for row in csv.DictReader(lines, fieldnames=_header)
+    ]
+
+
+def iter_puzzles(path, workers=1, compact=False):
+    """
+    Genera las filas parseadas del CSV en el orden del archivo.
+
+    Con workers > 1 el parseo se reparte en procesos y el proceso
+    actual queda como único escritor; como mucho 2 * workers
+    bloques en vuelo, así la memoria se mantiene acotada.
+    """
+    with open_csv(path) as f:
+        header = next(csv.reader([next(f)]))
+        chunks = iter(lambda: list(itertools.islice(f, PARSE_CHUNK_LINES)), [])
+
+        if workers <= 1:
+            _init_worker(header, compact)
+            for chunk in chunks:
+                yield from parse_chunk(chunk)
+            return
+
+        with Pool(workers, initializer=_init_worker, initargs=(header, compact)) as pool:
+            pending = deque()
+
+            for chunk in chunks:
+                pending.append(pool.apply_async(parse_chunk, (chunk,)))
+                if len(pending) >= workers * 2:
+                    yield from pending.popleft().get()
+
+            while pending:
+                yield from pending.popleft().get()
+
+
+def convert_csv_to_sqlite(csv_file=CSV_FILE, sqlite_file=SQLITE_FILE, workers=1,
+                          compact=False):
+    csv_path = find_csv(csv_file)
+    if csv_path is None:
+        print(f"ERROR: No se encontró {csv_file}")
         return
 
-    conn = sqlite3.connect(SQLITE_FILE)
+    conn = sqlite3.connect(sqlite_file)
     cursor = conn.cursor()
 
     print("Creando tablas e índices...")
@@ -63,65 +589,65 @@ def convert_csv_to_sqlite():
     conn.commit()
 
     print("Importando puzzles...")
+    theme_ids = load_themes(cursor)
+    opening_ids = load_openings(cursor)
     total = 0
     skipped = 0
 
-    with open(csv_path, "r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-
-        for row in reader:
-            # -----------------------------
-            # Filtro de estabilidad
-            # -----------------------------
-            try:
-                if int(row["RatingDeviation"]) >= rating_deviation_threshold or int(row["Rating"]) < min_rating:
-                    skipped += 1
-                    continue
-            except Exception:
-                skipped += 1
-                continue
-
-            puzzle_id = row["PuzzleId"]
-            fen = row["FEN"]
-            moves = row["Moves"]
-            rating = int(row["Rating"])
-
-            # rnd precomputado (clave del random rápido)
-            rnd = random.randint(0, 2**31 - 1)
-
-            # -----------------------------
-            # Insertar puzzle
-            # -----------------------------
-            cursor.execute("""
-                INSERT OR REPLACE INTO puzzles
-                (puzzle_id, fen, moves, rating, rnd)
-                VALUES (?, ?, ?, ?, ?)
-            """, (puzzle_id, fen, moves, rating, rnd))
-
-            # -----------------------------
-            # Procesar themes
-            # -----------------------------
-            themes = set()
-
-            for theme in row["Themes"].split():
-                themes.add(theme)
-
-            for opening in row["OpeningTags"].split():
-                themes.add(opening)
-
-            for theme in themes:
-                theme_id = get_or_create_theme(cursor, theme)
-                cursor.execute("""
-                    INSERT OR IGNORE INTO puzzle_themes (puzzle_id, theme_id)
-                    VALUES (?, ?)
-                """, (puzzle_id, theme_id))
-
-            total += 1
-
-            if total % BATCH_SIZE == 0:
-                conn.commit()
-                print(f"{total} puzzles procesados...")
+    for parsed in iter_puzzles(csv_path, workers, compact):
+        # -----------------------------
+        # Filtro de estabilidad
+        # -----------------------------
+        if parsed is None:
+            skipped += 1
+            continue
+
+        puzzle_id, fen, moves, rating, side, plies, themes, openings, fp = parsed
+
+        # rnd precomputado (clave del random rápido)
+        rnd = random.randint(0, 2**31 - 1)
+
+        # -----------------------------
+        # Procesar themes (máscara + sobrantes) y aperturas
+        # -----------------------------
+        mask, theme_rows = encode_themes(cursor, theme_ids, puzzle_id, themes)
+        opening_rows = encode_openings(cursor, opening_ids, puzzle_id, openings)
+
+        # -----------------------------
+        # Insertar puzzle
+        # -----------------------------
+        cursor.execute("""
+            INSERT OR REPLACE INTO puzzles
+            (puzzle_id, fen, moves, rating, rnd, fingerprint, theme_mask,
+             side_to_move, orientation, plies)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            puzzle_id, fen, moves, rating, rnd, fp, mask,
+            side, orientation(side), plies,
+        ))
+
+        cursor.executemany("""
+            INSERT OR IGNORE INTO puzzle_themes (puzzle_id, theme_id)
+            VALUES (?, ?)
+        """, theme_rows)
 
+        cursor.executemany("""
+            INSERT OR IGNORE INTO puzzle_openings (puzzle_id, opening_id)
+            VALUES (?, ?)
+        """, opening_rows)
+
+        total += 1
+
+        if total % BATCH_SIZE == 0:
+            conn.commit()
+            print(f"{total} puzzles procesados...")
+
+    conn.commit()
+
+    print("Construyendo tabla de muestreo e índices...")
+    build_sample_table(cursor)
+    build_rating_buckets(cursor)
+    create_indexes(cursor)
     conn.commit()
     conn.close()
 
@@ -129,9 +655,533 @@ def convert_csv_to_sqlite():
     print("Importación terminada")
     print(f"Puzzles insertados: {total}")
     print(f"Puzzles descartados: {skipped}")
-    print(f"Base SQLite creada: {SQLITE_FILE}")
+    print(f"Base SQLite creada: {sqlite_file}")
+    print("==========================================")
+
+    return True
+
+
+# =====================================================
+# Modo bulk: reconstrucción completa y rápida
+# =====================================================
+def flush_batch(cursor, puzzle_rows, theme_rows, opening_rows):
+    cursor.executemany("""
+        INSERT OR REPLACE INTO puzzles
+        (puzzle_id, fen, moves, rating, rnd, fingerprint, theme_mask,
+         side_to_move, orientation, plies)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, puzzle_rows)
+    cursor.executemany("""
+        INSERT OR IGNORE INTO puzzle_themes (puzzle_id, theme_id)
+        VALUES (?, ?)
+    """, theme_rows)
+    cursor.executemany("""
+        INSERT OR IGNORE INTO puzzle_openings (puzzle_id, opening_id)
+        VALUES (?, ?)
+    """, opening_rows)
+    puzzle_rows.clear()
+    theme_rows.clear()
+    opening_rows.clear()
+
+
+def bulk_convert_csv_to_sqlite(csv_file=CSV_FILE, sqlite_file=SQLITE_FILE, workers=1,
+                               compact=False):
+    """
+    Reconstruye la base desde cero:
+    - ids de themes en memoria
+    - inserts con executemany por lotes
+    - sin journal ni sync durante la carga
+    - índices y tablas derivadas al final
+
+    Se construye en un archivo aparte que reemplaza a sqlite_file
+    con os.replace al terminar: los workers siguen leyendo la base
+    anterior y un fallo a mitad no la deja corrupta.
+    """
+    csv_path = find_csv(csv_file)
+    if csv_path is None:
+        print(f"ERROR: No se encontró {csv_file}")
+        return
+
+    target = Path(sqlite_file)
+    building = target.with_name(f"{target.name}.building")
+    building.unlink(missing_ok=True)
+
+    try:
+        ok = _bulk_build(csv_path, building, workers, compact)
+        # Se cargó con synchronous = OFF: a disco antes de publicarlo
+        with open(building, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(building, target)
+    except BaseException:
+        building.unlink(missing_ok=True)
+        raise
+
+    print(f"Base SQLite creada: {sqlite_file}")
     print("==========================================")
+    return ok
+
+
+def _bulk_build(csv_path, sqlite_file, workers, compact):
+    conn = sqlite3.connect(sqlite_file)
+    cursor = conn.cursor()
+
+    cursor.executescript("""
+        PRAGMA journal_mode = OFF;
+        PRAGMA synchronous = OFF;
+        PRAGMA locking_mode = EXCLUSIVE;
+        PRAGMA temp_store = MEMORY;
+        PRAGMA cache_size = -262144;
+    """)
+
+    print("Creando tablas...")
+    create_tables(cursor)
+
+    print("Importando puzzles (bulk)...")
+    theme_ids = {}
+    opening_ids = {}
+    puzzle_rows = []
+    theme_rows = []
+    opening_rows = []
+    total = 0
+    skipped = 0
+    started = time.perf_counter()
+
+    cursor.execute("BEGIN")
+
+    for parsed in iter_puzzles(csv_path, workers, compact):
+        if parsed is None:
+            skipped += 1
+            continue
+
+        puzzle_id, fen, moves, rating, side, plies, themes, openings, fp = parsed
+        rnd = random.getrandbits(31)  # mismo rango que randint(0, 2**31 - 1)
+
+        mask, rows = encode_themes(cursor, theme_ids, puzzle_id, themes)
+        puzzle_rows.append((
+            puzzle_id, fen, moves, rating, rnd, fp, mask,
+            side, orientation(side), plies,
+        ))
+        theme_rows.extend(rows)
+        opening_rows.extend(
+            encode_openings(cursor, opening_ids, puzzle_id, openings)
+        )
+
+        total += 1
+
+        if total % BULK_BATCH_SIZE == 0:
+            flush_batch(cursor, puzzle_rows, theme_rows, opening_rows)
+            elapsed = time.perf_counter() - started
+            print(f"{total} puzzles procesados ({total / elapsed:,.0f} filas/s)...")
+
+    flush_batch(cursor, puzzle_rows, theme_rows, opening_rows)
+    conn.commit()
+
+    print("Construyendo tabla de muestreo e índices...")
+    build_sample_table(cursor)
+    build_rating_buckets(cursor)
+    create_indexes(cursor)
+    cursor.execute("ANALYZE")
+    conn.commit()
+
+    cursor.execute("PRAGMA journal_mode = DELETE")
+    conn.close()
+
+    elapsed = time.perf_counter() - started
+
+    print("==========================================")
+    print("Importación bulk terminada")
+    print(f"Puzzles insertados: {total}")
+    print(f"Puzzles descartados: {skipped}")
+    print(f"Tiempo: {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} filas/s)")
+
+    return True
+
+
+# =====================================================
+# Modo delta: aplica solo los cambios del dump nuevo
+# =====================================================
+def delta_convert_csv_to_sqlite(csv_file=CSV_FILE, sqlite_file=SQLITE_FILE, workers=1,
+                                compact=False):
+    """
+    Compara el dump con la base existente por huella de contenido:
+    - inserta puzzles nuevos (con rnd nuevo)
+    - actualiza solo los que cambiaron (conservando su rnd)
+    - elimina los que ya no están en Lichess
+    """
+    csv_path = find_csv(csv_file)
+    if csv_path is None:
+        print(f"ERROR: No se encontró {csv_file}")
+        return
+
+    if not Path(sqlite_file).exists():
+        print(f"ERROR: No existe {sqlite_file}; usa --bulk para crearla")
+        return
+
+    conn = sqlite3.connect(sqlite_file)
+    cursor = conn.cursor()
+    create_tables(cursor)
+
+    # El staging puede ser grande: a disco, no a memoria
+    cursor.executescript("""
+        PRAGMA temp_store = FILE;
+
+        CREATE TEMP TABLE delta_incoming (
+            puzzle_id TEXT PRIMARY KEY,
+            fen TEXT NOT NULL,
+            moves TEXT NOT NULL,
+            rating INTEGER NOT NULL,
+            rnd INTEGER NOT NULL,
+            fingerprint INTEGER NOT NULL,
+            theme_mask INTEGER NOT NULL,
+            side_to_move TEXT NOT NULL,
+            orientation TEXT NOT NULL,
+            plies INTEGER NOT NULL
+        );
+
+        CREATE TEMP TABLE delta_themes (
+            puzzle_id TEXT NOT NULL,
+            theme_id INTEGER NOT NULL
+        );
+
+        CREATE TEMP TABLE delta_openings (
+            puzzle_id TEXT NOT NULL,
+            opening_id INTEGER NOT NULL
+        );
+    """)
+
+    print("Leyendo dump...")
+    theme_ids = load_themes(cursor)
+    opening_ids = load_openings(cursor)
+    puzzle_rows = []
+    theme_rows = []
+    opening_rows = []
+    skipped = 0
+    started = time.perf_counter()
+
+    for parsed in iter_puzzles(csv_path, workers, compact):
+        if parsed is None:
+            skipped += 1
+            continue
+
+        puzzle_id, fen, moves, rating, side, plies, themes, openings, fp = parsed
+
+        mask, rows = encode_themes(cursor, theme_ids, puzzle_id, themes)
+        puzzle_rows.append((
+            puzzle_id, fen, moves, rating, random.getrandbits(31), fp, mask,
+            side, orientation(side), plies,
+        ))
+        theme_rows.extend(rows)
+        opening_rows.extend(
+            encode_openings(cursor, opening_ids, puzzle_id, openings)
+        )
+
+        if len(puzzle_rows) >= BULK_BATCH_SIZE:
+            cursor.executemany(
+                "INSERT OR REPLACE INTO delta_incoming VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                puzzle_rows
+            )
+            cursor.executemany(
+                "INSERT INTO delta_themes VALUES (?, ?)",
+                theme_rows
+            )
+            cursor.executemany(
+                "INSERT INTO delta_openings VALUES (?, ?)",
+                opening_rows
+            )
+            puzzle_rows.clear()
+            theme_rows.clear()
+            opening_rows.clear()
+
+    cursor.executemany(
+        "INSERT OR REPLACE INTO delta_incoming VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        puzzle_rows
+    )
+    cursor.executemany("INSERT INTO delta_themes VALUES (?, ?)", theme_rows)
+    cursor.executemany("INSERT INTO delta_openings VALUES (?, ?)", opening_rows)
+
+    print("Calculando diferencias...")
+    cursor.executescript("""
+        CREATE INDEX temp.idx_delta_themes ON delta_themes (puzzle_id);
+        CREATE INDEX temp.idx_delta_openings ON delta_openings (puzzle_id);
+
+        CREATE TEMP TABLE delta_new AS
+        SELECT i.puzzle_id
+        FROM delta_incoming i
+        WHERE NOT EXISTS (
+            SELECT 1 FROM puzzles p WHERE p.puzzle_id = i.puzzle_id
+        );
+
+        CREATE TEMP TABLE delta_changed AS
+        SELECT i.puzzle_id
+        FROM delta_incoming i
+        JOIN puzzles p ON p.puzzle_id = i.puzzle_id
+        WHERE p.fingerprint IS NOT i.fingerprint
+           -- Cambio de formato (texto <-> compacto)
+           OR typeof(p.moves) != typeof(i.moves);
+
+        CREATE TEMP TABLE delta_removed AS
+        SELECT p.puzzle_id
+        FROM puzzles p
+        WHERE NOT EXISTS (
+            SELECT 1 FROM delta_incoming i WHERE i.puzzle_id = p.puzzle_id
+        );
+
+        -- Puzzles cuyo contenido viejo hay que retirar
+        CREATE TEMP TABLE delta_stale AS
+        SELECT puzzle_id FROM delta_changed
+        UNION
+        SELECT puzzle_id FROM delta_removed;
+
+        -- Puzzles cuyo contenido nuevo hay que escribir
+        CREATE TEMP TABLE delta_fresh AS
+        SELECT puzzle_id FROM delta_changed
+        UNION
+        SELECT puzzle_id FROM delta_new;
+    """)
+
+    new, changed, removed = (
+        cursor.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        for table in ("delta_new", "delta_changed", "delta_removed")
+    )
+
+    print("Aplicando cambios...")
+    stale_pairs = PUZZLE_THEME_PAIRS.format(
+        where="WHERE p.puzzle_id IN (SELECT puzzle_id FROM delta_stale)"
+    )
+    fresh_pairs = PUZZLE_THEME_PAIRS.format(
+        where="WHERE p.puzzle_id IN (SELECT puzzle_id FROM delta_fresh)"
+    )
+    stale_openings = PUZZLE_OPENING_PAIRS.format(
+        where="WHERE p.puzzle_id IN (SELECT puzzle_id FROM delta_stale)"
+    )
+    fresh_openings = PUZZLE_OPENING_PAIRS.format(
+        where="WHERE p.puzzle_id IN (SELECT puzzle_id FROM delta_fresh)"
+    )
+
+    cursor.executescript(f"""
+        BEGIN;
+
+        DELETE FROM puzzle_samples
+        WHERE (theme_id, bucket, rnd, puzzle_id) IN (
+            SELECT theme_id, bucket, rnd, puzzle_id FROM ({stale_pairs})
+        );
+
+        DELETE FROM opening_samples
+        WHERE (opening_id, bucket, rnd, puzzle_id) IN (
+            SELECT opening_id, bucket, rnd, puzzle_id FROM ({stale_openings})
+        );
+
+        DELETE FROM puzzle_themes
+        WHERE puzzle_id IN (SELECT puzzle_id FROM delta_stale);
+
+        DELETE FROM puzzle_openings
+        WHERE puzzle_id IN (SELECT puzzle_id FROM delta_stale);
+
+        DELETE FROM puzzles
+        WHERE puzzle_id IN (SELECT puzzle_id FROM delta_removed);
+
+        -- Los puzzles modificados conservan su rnd
+        UPDATE puzzles
+        SET fen = i.fen,
+            moves = i.moves,
+            rating = i.rating,
+            fingerprint = i.fingerprint,
+            theme_mask = i.theme_mask,
+            side_to_move = i.side_to_move,
+            orientation = i.orientation,
+            plies = i.plies
+        FROM delta_incoming i
+        WHERE i.puzzle_id = puzzles.puzzle_id
+          AND puzzles.puzzle_id IN (SELECT puzzle_id FROM delta_changed);
+
+        INSERT INTO puzzles
+        (puzzle_id, fen, moves, rating, rnd, fingerprint, theme_mask,
+         side_to_move, orientation, plies)
+        SELECT i.puzzle_id, i.fen, i.moves, i.rating, i.rnd, i.fingerprint, i.theme_mask,
+               i.side_to_move, i.orientation, i.plies
+        FROM delta_new n
+        JOIN delta_incoming i ON i.puzzle_id = n.puzzle_id;
+
+        INSERT OR IGNORE INTO puzzle_themes (puzzle_id, theme_id)
+        SELECT t.puzzle_id, t.theme_id
+        FROM delta_fresh f
+        JOIN delta_themes t ON t.puzzle_id = f.puzzle_id;
+
+        INSERT OR IGNORE INTO puzzle_openings (puzzle_id, opening_id)
+        SELECT o.puzzle_id, o.opening_id
+        FROM delta_fresh f
+        JOIN delta_openings o ON o.puzzle_id = f.puzzle_id;
+
+        INSERT OR IGNORE INTO puzzle_samples
+        (theme_id, bucket, rnd, puzzle_id, rating, plies)
+        SELECT theme_id, bucket, rnd, puzzle_id, rating, plies FROM ({fresh_pairs});
+
+        INSERT OR IGNORE INTO opening_samples
+        (opening_id, bucket, rnd, puzzle_id, rating, plies)
+        SELECT opening_id, bucket, rnd, puzzle_id, rating, plies FROM ({fresh_openings});
+    """)
+
+    build_rating_buckets(cursor)
+    create_indexes(cursor)
+    conn.commit()
+    conn.close()
+
+    elapsed = time.perf_counter() - started
+
+    print("==========================================")
+    print("Importación delta terminada")
+    print(f"Puzzles nuevos: {new}")
+    print(f"Puzzles actualizados: {changed}")
+    print(f"Puzzles eliminados: {removed}")
+    print(f"Puzzles descartados: {skipped}")
+    print(f"Tiempo: {elapsed:.1f}s")
+    print(f"Base SQLite actualizada: {sqlite_file}")
+    print("==========================================")
+
+    return True
+
+
+# =====================================================
+# Snapshots versionados (hot swap sin reiniciar workers)
+# =====================================================
+def manifest_path(sqlite_file):
+    return Path(sqlite_file).with_suffix(".json")
+
+
+def current_snapshot(sqlite_file):
+    """
+    Archivo activo según el manifest, o sqlite_file si no hay manifest.
+    """
+    manifest = manifest_path(sqlite_file)
+    if manifest.exists():
+        with open(manifest, encoding="utf-8") as f:
+            return manifest.parent / json.load(f)["file"]
+
+    path = Path(sqlite_file)
+    return path if path.exists() else None
+
+
+def new_snapshot(sqlite_file, copy_current=False):
+    """
+    Ruta del snapshot nuevo; con copy_current parte de una copia
+    consistente del activo (para el modo delta).
+    """
+    path = Path(sqlite_file)
+    current = current_snapshot(sqlite_file)
+
+    # Con microsegundos (y contador si aun así existe) dos imports
+    # seguidos no comparten nombre: el segundo copiaría el activo sobre
+    # sí mismo o lo reemplazaría mientras los workers lo leen
+    now = time.time()
+    version = time.strftime("%Y%m%d-%H%M%S", time.gmtime(now))
+    version += f"-{int(now * 1_000_000) % 1_000_000:06d}"
+    snapshot = path.with_name(f"{path.stem}-{version}{path.suffix}")
+    counter = 0
+    while snapshot.exists():
+        counter += 1
+        snapshot = path.with_name(f"{path.stem}-{version}-{counter}{path.suffix}")
+
+    if current is not None and snapshot.resolve() == current.resolve():
+        raise RuntimeError(f"El snapshot nuevo coincide con el activo: {snapshot}")
+
+    if copy_current:
+        if current is not None:
+            src = sqlite3.connect(current)
+            dst = sqlite3.connect(snapshot)
+            src.backup(dst)
+            dst.close()
+            src.close()
+
+    return snapshot
+
+
+def publish_snapshot(sqlite_file, snapshot):
+    """
+    Reemplaza el manifest de forma atómica y borra snapshots viejos.
+    """
+    path = Path(sqlite_file)
+    manifest = manifest_path(sqlite_file)
+    tmp = manifest.with_suffix(".json.tmp")
+
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({
+            "file": snapshot.name,
+            "version": snapshot.stem[len(path.stem) + 1:],
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        }, f)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp, manifest)
+    print(f"Snapshot publicado: {snapshot.name}")
+
+    old = sorted(
+        p for p in path.parent.glob(f"{path.stem}-*{path.suffix}")
+        if p != snapshot
+    )
+    for p in old[:max(0, len(old) - KEEP_SNAPSHOTS)]:
+        p.unlink()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Importa el CSV de puzzles de Lichess a SQLite"
+    )
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="Reconstruye la base desde cero en modo rápido",
+    )
+    parser.add_argument(
+        "--delta",
+        action="store_true",
+        help="Aplica solo nuevos / modificados / eliminados sobre la base existente",
+    )
+    parser.add_argument(
+        "--csv",
+        default=CSV_FILE,
+        help="CSV de Lichess, plano o comprimido (.zst, .gz, .bz2)",
+    )
+    parser.add_argument(
+        "--db",
+        default=SQLITE_FILE,
+        help="Archivo SQLite de destino",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Procesos que parsean el CSV (1 = sin paralelismo)",
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Guarda FEN y jugadas en formato binario compacto",
+    )
+    parser.add_argument(
+        "--snapshot",
+        action="store_true",
+        help="Escribe un snapshot versionado y lo publica en el manifest",
+    )
+    args = parser.parse_args()
+
+    target = args.db
+    if args.snapshot:
+        target = new_snapshot(args.db, copy_current=not args.bulk)
+
+    if args.bulk:
+        ok = bulk_convert_csv_to_sqlite(args.csv, target, args.workers, args.compact)
+    elif args.delta:
+        ok = delta_convert_csv_to_sqlite(args.csv, target, args.workers, args.compact)
+    else:
+        ok = convert_csv_to_sqlite(args.csv, target, args.workers, args.compact)
+
+    if args.snapshot:
+        if ok:
+            publish_snapshot(args.db, target)
+        elif Path(target).exists():
+            Path(target).unlink()
 
 
 if __name__ == "__main__":
-    convert_csv_to_sqlite()
+    main()